@@ -0,0 +1,134 @@
+"""
+Compares OurAPI's sync (main.py, threadpool) and async (async_main.py, event loop) modes.
+
+Each mode is started in its own uvicorn process, on a fresh file-backed SQLite database
+in WAL mode, and driven by --concurrency client
+threads, every one of them replaying the calls the integration makes for a conversation:
+create the chat, look it up by external ID, add --messages messages and end it.
+Requests/sec and latency percentiles per mode are printed and saved as JSON:
+
+    python benchmarks/our_api_modes.py --conversations 500 --concurrency 32
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from throughput import RESULTS, ROOT, _commit, _free_port, _percentile
+
+MODES = {"sync": "main:app", "async": "async_main:app"}
+
+
+def _start(app: str, port: int, database_url: str) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT / "our_api",
+        env={**os.environ, "OUR_API_DATABASE_URL": database_url},
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/agents", timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"{app} didn't start")
+
+
+def _conversation(session: requests.Session, base_url: str, agent_id: str, number: int, messages: int) -> list:
+    """The calls the integration makes for a conversation, returns their latencies"""
+    latencies = []
+
+    def _call(method, path, **kwargs):
+        started_at = time.perf_counter()
+        response = session.request(method, f"{base_url}{path}", **kwargs)
+        latencies.append(time.perf_counter() - started_at)
+        response.raise_for_status()
+        return response
+
+    started_at = int(datetime.now().timestamp())
+    chat = _call("POST", "/chats", json={"external_id": str(number), "started_at": started_at, "agent_id": agent_id})
+    chat_id = chat.json()["chat_id"]
+    _call("GET", "/chats", params={"external_id": str(number)})
+    for message in range(messages):
+        _call("POST", f"/chats/{chat_id}/messages", json={"sent_at": started_at + message, "text": "foo bar"})
+    _call("PATCH", f"/chats/{chat_id}", json={"ended_at": started_at + messages})
+    return latencies
+
+
+def run_mode(mode: str, conversations: int, concurrency: int, messages: int, database_url: str) -> dict:
+    port = _free_port()
+    server = _start(MODES[mode], port, database_url)
+    base_url = f"http://127.0.0.1:{port}"
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=concurrency))
+    try:
+        agent = session.post(f"{base_url}/agents", json={"name": "Jhon", "email": "jhon@domain.com"})
+        agent.raise_for_status()
+        agent_id = agent.json()["agent_id"]
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(
+                executor.map(
+                    lambda number: _conversation(session, base_url, agent_id, number, messages), range(conversations)
+                )
+            )
+        elapsed = time.perf_counter() - started_at
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = [latency for result in results for latency in result]
+    return {
+        "requests": len(latencies),
+        "elapsed_seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "latency_p50": statistics.median(latencies),
+        "latency_p99": _percentile(latencies, 99),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads")
+    parser.add_argument("--messages", type=int, default=3, help="messages per conversation")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--output", type=Path, help="where to save the JSON results")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        result = {
+            "commit": _commit(),
+            "taken_at": datetime.now().isoformat(timespec="seconds"),
+            "parameters": {
+                "conversations": args.conversations,
+                "concurrency": args.concurrency,
+                "messages": args.messages,
+            },
+        }
+        for mode in args.modes:
+            database_url = f"sqlite:///{directory}/{mode}.db"
+            result[mode] = run_mode(mode, args.conversations, args.concurrency, args.messages, database_url)
+            print(f"{mode:>5}: {json.dumps(result[mode])}")
+
+    output = args.output or RESULTS / f"our_api_modes-{result['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"Saved to {output}")
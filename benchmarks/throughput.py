@@ -0,0 +1,177 @@
+"""
+End to end throughput benchmark for the integration.
+
+BigChat and OurAPI run in this same process on free local ports and
+integration.main.main is driven over many consecutive windows. Load is seeded
+and scales with --new-per-window, the amount of conversations BigChat starts
+on every /events call (active conversations settle around 5x that number since
+BigChat ends a conversation with a 20% chance per call).
+
+Results (events/sec, per window latency percentiles, HTTP calls per event and
+peak RSS) are printed and saved as JSON so they can be compared between commits:
+
+    PYTHONPATH=. python benchmarks/throughput.py --windows 30 --new-per-window 20
+    PYTHONPATH=. python benchmarks/throughput.py --compare benchmarks/results/<commit>.json
+"""
+import argparse
+import importlib
+import json
+import logging
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import uvicorn
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS = Path(__file__).resolve().parent / "results"
+COMPARED = ("events_per_second", "window_latency_p50", "window_latency_p99", "http_calls_per_event", "peak_rss_mib")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _load_big_chat(seed: int, new_per_window: int):
+    big_chat = importlib.import_module("big_chat.main")
+    big_chat.faker.seed_instance(seed)
+    random.seed(seed)
+    # the stand-in starts 0 or 1 conversations per call, make it a fixed and scalable amount
+    big_chat.randrange = lambda stop: new_per_window
+    # the stand-in picks advisors with choice() over a dict keyed from 1, pick over its values instead
+    big_chat.choice = lambda sequence: random.choice(
+        list(sequence.values()) if isinstance(sequence, dict) else list(sequence)
+    )
+    big_chat.logger.setLevel(logging.WARNING)
+    return big_chat
+
+
+def _load_our_api():
+    # OurAPI imports its packages as top level modules
+    sys.path.insert(0, str(ROOT / "our_api"))
+    our_api = importlib.import_module("main")
+    our_api.logger.setLevel(logging.WARNING)
+    return our_api
+
+
+def _percentile(values, percent: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(windows: int, warmup_windows: int, new_per_window: int, delta_seconds: int, seed: int) -> dict:
+    big_chat = _load_big_chat(seed, new_per_window)
+    our_api = _load_our_api()
+    big_chat_port, our_api_port = _free_port(), _free_port()
+    servers = [_serve(big_chat.app, big_chat_port), _serve(our_api.app, our_api_port)]
+
+    from integration import main as integration
+    from integration.client import big_chat_client, our_api_client
+    from integration.metrics import events_received, http_requests, registry
+
+    big_chat_client.base_url = f"http://127.0.0.1:{big_chat_port}"
+    our_api_client.base_url = f"http://127.0.0.1:{our_api_port}"
+    logging.getLogger().setLevel(logging.WARNING)
+
+    start_at = datetime.now() - timedelta(seconds=(windows + warmup_windows) * delta_seconds)
+    latencies, errors = [], 0
+    try:
+        for window in range(warmup_windows + windows):
+            if window == warmup_windows:
+                registry.clear()  # only measured windows count
+            end_at = start_at + timedelta(seconds=delta_seconds)
+            started = time.perf_counter()
+            try:
+                integration.main(start_at, end_at)
+            except Exception as exception:
+                errors += window >= warmup_windows
+                logging.getLogger().warning(f"Window {window} failed: {exception!r}")
+            if window >= warmup_windows:
+                latencies.append(time.perf_counter() - started)
+            start_at = end_at
+    finally:
+        for server in servers:
+            server.should_exit = True
+
+    events = events_received.total()
+    elapsed = sum(latencies)
+    return {
+        "commit": _commit(),
+        "taken_at": datetime.now().isoformat(timespec="seconds"),
+        "parameters": {
+            "windows": windows,
+            "warmup_windows": warmup_windows,
+            "new_per_window": new_per_window,
+            "delta_seconds": delta_seconds,
+            "seed": seed,
+        },
+        "events": events,
+        "failed_windows": errors,
+        "elapsed_seconds": elapsed,
+        "events_per_second": events / elapsed if elapsed else 0.0,
+        "window_latency_p50": statistics.median(latencies) if latencies else 0.0,
+        "window_latency_p99": _percentile(latencies, 99),
+        "http_calls": http_requests.total(),
+        "http_calls_per_event": http_requests.total() / events if events else 0.0,
+        # ru_maxrss is in KiB on Linux, it includes the in-process BigChat and OurAPI
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def compare(result: dict, baseline: dict) -> None:
+    for key in COMPARED:
+        before, after = baseline.get(key, 0), result[key]
+        change = f"{(after - before) / before:+.1%}" if before else "n/a"
+        print(f"{key:>22}: {before:10.3f} -> {after:10.3f} ({change})")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--windows", type=int, default=20, help="measured windows")
+    parser.add_argument("--warmup-windows", type=int, default=5, help="windows run before measuring")
+    parser.add_argument("--new-per-window", type=int, default=10, help="conversations started per window")
+    parser.add_argument("--delta-seconds", type=int, default=10, help="simulated window size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="where to save the JSON results")
+    parser.add_argument("--compare", type=Path, help="previous JSON results to compare with")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = run(args.windows, args.warmup_windows, args.new_per_window, args.delta_seconds, args.seed)
+
+    output = args.output or RESULTS / f"throughput-{result['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(json.dumps(result, indent=2))
+    print(f"Saved to {output}")
+    if args.compare:
+        compare(result, json.loads(args.compare.read_text()))
@@ -0,0 +1,83 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterator, Tuple
+
+from integration.constants import (BACKFILL_FETCH_CONCURRENCY,
+                                   BACKFILL_PROGRESS_INTERVAL, DELTA_SECONDS,
+                                   MAX_CONCURRENCY)
+from integration.events.pipeline import flush_pending, run_events
+from integration.fetcher import fetch_window
+
+
+def chunks(start_at: datetime, end_at: datetime, delta_seconds: float) -> Iterator[Tuple[datetime, datetime]]:
+    """Split the range into consecutive windows of delta_seconds, the last one may be shorter"""
+    delta = timedelta(seconds=delta_seconds)
+    while start_at < end_at:
+        yield start_at, min(start_at + delta, end_at)
+        start_at += delta
+
+
+def backfill(
+    start_at: datetime,
+    end_at: datetime,
+    logger: Any,
+    delta_seconds: float = DELTA_SECONDS,
+    fetch_concurrency: int = BACKFILL_FETCH_CONCURRENCY,
+    max_concurrency: int = MAX_CONCURRENCY,
+    progress_interval: float = BACKFILL_PROGRESS_INTERVAL,
+    clock: Callable[[], float] = time.monotonic,
+) -> int:
+    """
+    Import the events of a past range. Windows are fetched from BigChat up to
+    `fetch_concurrency` at a time but applied to OurAPI in window order, so events
+    of a conversation are applied in order. Windows already fetched when the
+    pipeline frees up are applied together. Returns the events processed
+    """
+    windows = list(chunks(start_at, end_at, delta_seconds))
+    logger.info(f"Backfilling {len(windows)} window(s) from {start_at} to {end_at}")
+    started_at = last_log = clock()
+    done = events_done = 0
+    to_fetch = iter(windows)
+    in_flight = deque()  # futures in window order
+
+    with ThreadPoolExecutor(max_workers=fetch_concurrency) as executor:
+
+        def _fill() -> None:
+            while len(in_flight) < fetch_concurrency and (window := next(to_fetch, None)):
+                in_flight.append(executor.submit(fetch_window, *window))
+
+        try:
+            _fill()
+            while in_flight:
+                events = in_flight.popleft().result()
+                applied = 1
+                while in_flight and in_flight[0].done():
+                    events += in_flight.popleft().result()
+                    applied += 1
+                # the next windows are fetched while these are applied
+                _fill()
+                run_events(events, logger, max_concurrency)
+                done += applied
+                events_done += len(events)
+
+                now = clock()
+                if now - last_log >= progress_interval or done == len(windows):
+                    last_log = now
+                    eta = timedelta(seconds=round((now - started_at) / done * (len(windows) - done)))
+                    logger.info(
+                        f"Backfilled {done}/{len(windows)} window(s) ({done / len(windows):.0%}), "
+                        f"{events_done} event(s), ETA {eta}"
+                    )
+        except Exception:
+            for future in in_flight:
+                future.cancel()
+            if done < len(windows):
+                logger.error(f"Backfill stopped, resume it from {windows[done][0]} to {end_at}")
+            raise
+        finally:
+            # no START will come for the events still held once the range is over
+            flush_pending(logger, max_concurrency)
+
+    return events_done
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread safe mapping bounded to `maxsize` entries, the least recently used
+    entry is evicted first and entries can optionally expire after `ttl` seconds
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        return None if ttl is None else self.clock() + ttl
+
+    def _lookup(self, key: Hashable) -> Any:
+        """Return the live value for key or _MISSING, dropping it if expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self.clock():
+            del self._data[key]
+            self.evictions += 1
+            return _MISSING
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Like get but without touching the counters or the LRU order"""
+        with self._lock:
+            value = self._lookup(key)
+            return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Any = _MISSING) -> None:
+        with self._lock:
+            self._data[key] = (value, self._expires_at(self.ttl if ttl is _MISSING else ttl))
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._purge()
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+            self._data.pop(key, None)
+            return default if value is _MISSING else value
+
+    def _purge(self) -> None:
+        now = self.clock()
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        self.evictions += len(expired)
+
+    def purge(self) -> None:
+        """Drop every expired entry, expired entries are otherwise dropped lazily"""
+        with self._lock:
+            self._purge()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.peek(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
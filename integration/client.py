@@ -0,0 +1,117 @@
+import time
+from http import HTTPStatus
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from integration.constants import (BIG_CHAT_API, BIG_CHAT_POOL_SIZE,
+                                   HTTP_HEADERS, HTTP_TIMEOUT, OUR_API,
+                                   OUR_API_INITIAL_CONCURRENCY,
+                                   OUR_API_MAX_CONCURRENCY,
+                                   OUR_API_MAX_ERROR_RATE, OUR_API_MAX_RPS,
+                                   OUR_API_MIN_CONCURRENCY, OUR_API_POOL_SIZE,
+                                   OUR_API_TARGET_LATENCY)
+from integration.limiter import AdaptiveLimiter
+from integration.metrics import concurrency_limit, error_rate, observe_http
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTP adapter applying a default timeout to every request it sends"""
+
+    def __init__(self, timeout: float, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+class ApiClient:
+    """
+    Client for one upstream API, all the requests share a pool of
+    keep-alive connections so the TCP handshake is only paid once
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int,
+        timeout: float = HTTP_TIMEOUT,
+        headers: Optional[dict] = None,
+        name: str = "api",
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        self.name = name  # used to label the metrics
+        self.limiter = limiter
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.headers = {**HTTP_HEADERS, **(headers or {})}
+        self.session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        session.headers.update(self.headers)
+        # block instead of opening throwaway connections when the pool is exhausted
+        adapter = TimeoutHTTPAdapter(self.timeout, pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def url(self, path: str) -> str:
+        """Absolute URLs (like BigChat's nextPageUrl) are used as they are"""
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}{path}"
+
+    def _send(self, method: str, path: str, **kwargs) -> requests.Response:
+        url = self.url(path)
+        status = "error"
+        if self.limiter:
+            self.limiter.acquire()
+        started_at = time.perf_counter()
+        try:
+            response = getattr(self.session, method)(url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - started_at
+            observe_http(self.name, method, url, status, elapsed)
+            if self.limiter:
+                # connection errors, timeouts, throttling and server errors mean the downstream is struggling
+                failed = not isinstance(status, int) or status >= 500 or status == HTTPStatus.TOO_MANY_REQUESTS
+                self.limiter.release(elapsed, failed)
+                concurrency_limit.set(self.limiter.limit, api=self.name)
+                error_rate.set(self.limiter.error_rate, api=self.name)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self._send("get", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self._send("post", path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> requests.Response:
+        return self._send("patch", path, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+big_chat_client = ApiClient(BIG_CHAT_API, BIG_CHAT_POOL_SIZE, name="big_chat")
+# OurAPI is a single SQLite backed process, pushing it harder than it can take only adds latency
+our_api_client = ApiClient(
+    OUR_API,
+    OUR_API_POOL_SIZE,
+    name="our_api",
+    limiter=AdaptiveLimiter(
+        OUR_API_INITIAL_CONCURRENCY,
+        OUR_API_MIN_CONCURRENCY,
+        OUR_API_MAX_CONCURRENCY,
+        OUR_API_TARGET_LATENCY,
+        max_error_rate=OUR_API_MAX_ERROR_RATE,
+        max_rps=OUR_API_MAX_RPS,
+    ),
+)
@@ -1,3 +1,41 @@
 OUR_API = "http://localhost:8266"
 BIG_CHAT_API = "http://localhost:8267"
 DELTA_SECONDS = 10
+CATCH_UP_POLICY = "sequential"  # "sequential" or "merge", see integration.scheduler
+MAX_CONCURRENCY = 8  # how many conversations are processed at the same time
+HTTP_TIMEOUT = 5  # seconds to wait for a connection or a response
+HTTP_HEADERS = {"Accept": "application/json", "User-Agent": "edgetier-integration"}
+BIG_CHAT_POOL_SIZE = MAX_CONCURRENCY  # keep-alive connections per host
+OUR_API_POOL_SIZE = MAX_CONCURRENCY
+ADVISOR_CACHE_SIZE = 1000  # BigChat advisor profiles kept in memory
+ADVISOR_CACHE_TTL = 60 * 60  # seconds until a profile is fetched again
+AGENT_CACHE_SIZE = 1000  # advisor id to OurAPI agent id resolutions kept in memory
+AGENT_CACHE_TTL = 60 * 60
+CHAT_CACHE_SIZE = 10_000  # conversation id to OurAPI chat id resolutions kept in memory
+CHAT_CACHE_END_GRACE = 60  # seconds an ended chat stays cached for late events
+MISSING_CHAT_CACHE_SIZE = 10_000  # conversations known to have no chat in OurAPI
+MISSING_CHAT_CACHE_TTL = 30  # seconds until a conversation without chat is looked up again
+WARM_UP_PAGE_SIZE = 1000  # open chats per OurAPI page when warming up the chat cache
+OUR_API_NEXT_CURSOR_HEADER = "X-Next-Cursor"  # where OurAPI listings put the cursor of their next page
+PREFETCH_PAGES = 2  # BigChat pages fetched ahead while the current one is processed
+COALESCE_EVENTS = True  # merge the events of a conversation into the fewest OurAPI operations
+STREAM_EVENTS = False  # parse BigChat pages incrementally instead of loading them whole
+STREAM_BATCH_SIZE = 100  # events handed to the pipeline at once when streaming
+STREAM_CHUNK_SIZE = 16 * 1024  # bytes read from the response at once when streaming
+SHARDS = 1  # worker processes events are partitioned across, 1 disables sharding
+METRICS_DUMP_INTERVAL = 60  # seconds between metric snapshots when dumping them to a file
+OUR_API_INITIAL_CONCURRENCY = 4  # OurAPI requests in flight before the limiter adapts
+OUR_API_MIN_CONCURRENCY = 1
+OUR_API_MAX_CONCURRENCY = OUR_API_POOL_SIZE
+OUR_API_TARGET_LATENCY = 0.25  # seconds, slower responses mean OurAPI is overloaded
+OUR_API_MAX_ERROR_RATE = 0.1  # smoothed share of failed OurAPI responses tolerated before backing off
+OUR_API_MAX_RPS = None  # optional hard ceiling of OurAPI requests per second
+RETRY_ATTEMPTS = 4  # tries for an event or a page before giving up on transient errors
+RETRY_BASE_DELAY = 0.5  # seconds, doubled on every attempt
+RETRY_MAX_DELAY = 8
+DEAD_LETTER_PATH = "dead_letters.jsonl"  # events that failed after every retry
+PENDING_TIMEOUT = 30  # seconds events wait for the START of their conversation before looking the chat up
+PENDING_MAX_CONVERSATIONS = 10_000  # conversations with events waiting for their START
+BACKFILL_FETCH_CONCURRENCY = 8  # windows fetched from BigChat at the same time when backfilling
+BACKFILL_PROGRESS_INTERVAL = 5  # seconds between backfill progress logs
+PROFILE_WINDOWS = 10  # windows traced by --profile before exiting
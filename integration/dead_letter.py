@@ -0,0 +1,57 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from integration.constants import DEAD_LETTER_PATH
+from integration.metrics import dead_lettered
+
+
+class DeadLetterQueue:
+    """
+    Events that could not be processed, stored on disk one JSON document per line
+    so they survive restarts and can be replayed later
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def put(self, event: dict, error: str) -> None:
+        line = json.dumps({"failed_at": time.time(), "error": error, "event": event}) + "\n"
+        # a single append per entry so lines from several processes don't interleave
+        with self._lock, open(self.path, "a") as file:
+            file.write(line)
+        dead_lettered.inc(event_name=event.get("event_name"))
+
+    @contextmanager
+    def drain(self) -> Iterator[List[dict]]:
+        """
+        Take every entry out of the queue for a replay, entries failing again are put back by whoever
+        processes them. Entries stay on disk until the replay returns, the ones of a replay that died
+        are replayed first by the next one and newer entries wait for the replay after it
+        """
+        draining = f"{self.path}.draining"
+        with self._lock:
+            try:
+                if not os.path.exists(draining):
+                    os.replace(self.path, draining)
+                with open(draining) as file:
+                    entries = [json.loads(line) for line in file if line.strip()]
+            except FileNotFoundError:
+                entries = []
+        yield entries
+        if entries:
+            os.remove(draining)
+
+    def __len__(self) -> int:
+        try:
+            with open(self.path) as file:
+                return sum(1 for line in file if line.strip())
+        except FileNotFoundError:
+            return 0
+
+
+dead_letters = DeadLetterQueue(DEAD_LETTER_PATH)
@@ -0,0 +1,52 @@
+from dataclasses import replace
+from typing import List
+
+from integration.events.models import (EndEvent, Event, MessageEvent,
+                                       StartEvent, TransferEvent)
+
+# order for events of a conversation sharing the same event_at
+_PRIORITY = {
+    StartEvent: 0,
+    MessageEvent: 1,
+    TransferEvent: 1,
+    EndEvent: 2,
+}
+
+
+def _sort_key(event: Event) -> tuple:
+    # nothing can happen to a conversation before it starts
+    return not isinstance(event, StartEvent), event.event_at, _PRIORITY[type(event)]
+
+
+def coalesce_lane(lane: List) -> List:
+    """
+    Merge the events of a single conversation into the minimum set of events
+    that leaves OurAPI in the same end state:
+        - START followed by END becomes a START carrying ended_at
+        - consecutive TRANSFERs collapse into the last one
+        - a TRANSFER is folded into the START or END it comes with
+    MESSAGEs are kept since each one is a row of its own
+    """
+    start, end, transfer, messages = None, None, None, []
+    for event in sorted(lane, key=_sort_key):
+        match event:
+            case StartEvent():
+                start = event
+            case EndEvent():
+                end = event
+            case TransferEvent():
+                transfer = event
+            case MessageEvent():
+                messages.append(event)
+
+    if start:
+        data = {}
+        if transfer:
+            data["new_advisor_id"] = transfer.new_advisor_id
+        if end:
+            data["ended_at"] = end.event_at
+        return [replace(start, **data) if data else start] + messages
+
+    if end and transfer:
+        return messages + [replace(end, new_advisor_id=transfer.new_advisor_id)]
+    return messages + [event for event in (transfer, end) if event]
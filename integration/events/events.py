@@ -1,40 +1,91 @@
 from collections import Counter
-from typing import Any, List
+from http import HTTPStatus
+from typing import Any, List, Optional
 
-import requests
+from requests import Response
 
-from integration.constants import OUR_API
-from integration.events import constants
+from integration.client import our_api_client
+from integration.constants import CHAT_CACHE_END_GRACE
 from integration.events.constants import (EVENT_END_LOG, EVENT_MESSAGE_LOG,
                                           EVENT_START_LOG, EVENT_TRANSFER_LOG)
-from integration.events.utils import (search_advisor, search_chat,
-                                      search_or_create_agent)
+from integration.events.models import (EndEvent, Event, MessageEvent,
+                                       StartEvent, TransferEvent, parse_events)
+from integration.events.utils import (chat_cache, missing_chat_cache,
+                                      search_advisor, search_chat,
+                                      write_as_agent)
+from integration.tracing import tracer
 
 
-def _create_chat(conversation_id: int, event_at: int, logger: Any) -> None:
-    agent_id = search_or_create_agent(search_advisor(conversation_id), logger)
-    response = requests.post(
-        f"{OUR_API}/chats", json={"external_id": str(conversation_id), "started_at": event_at, "agent_id": agent_id}
-    )
-    response.raise_for_status()
-    logger.info(f"{EVENT_START_LOG} Created chat {response.json()['chat_id']}")
+def _create_chat(
+    conversation_id: int,
+    event_at: int,
+    logger: Any,
+    ended_at: Optional[int] = None,
+    advisor_id: Optional[int] = None,
+) -> None:
+    """
+    ended_at and advisor_id are known up front when later events were coalesced into the START.
 
+    Creating the chat is idempotent: when a retry finds the chat already there, because the first
+    attempt was committed but its response got lost, the existing chat is used.
+    """
+    if advisor_id is None:
+        advisor_id = search_advisor(conversation_id)
 
-def _end_chat(conversation_id: int, event_at: int, logger: Any) -> None:
+    def _post(agent_id: str) -> Response:
+        data = {"external_id": str(conversation_id), "started_at": event_at, "agent_id": agent_id}
+        if ended_at is not None:
+            data["ended_at"] = ended_at
+        with tracer.span("write", "POST /chats"):
+            return our_api_client.post("/chats", json=data)
+
+    response = write_as_agent(advisor_id, logger, _post)
+    if response.status_code == HTTPStatus.CONFLICT:
+        # a miss cached before the chat was created must not hide it
+        missing_chat_cache.pop(conversation_id)
+        chat_id = search_chat(conversation_id)
+        if chat_id is None:
+            response.raise_for_status()
+        logger.info(f"{EVENT_START_LOG} Chat {chat_id} already exists")
+    else:
+        response.raise_for_status()
+        chat_id = response.json()["chat_id"]
+        logger.info(f"{EVENT_START_LOG} Created chat {chat_id}")
+    chat_cache.set(conversation_id, chat_id, ttl=None if ended_at is None else CHAT_CACHE_END_GRACE)
+    missing_chat_cache.pop(conversation_id)
+
+
+def _end_chat(conversation_id: int, event_at: int, logger: Any, new_advisor: Optional[int] = None) -> None:
+    """new_advisor is set when a TRANSFER was coalesced into the END"""
     chat_id = search_chat(conversation_id)
     if chat_id:
-        response = requests.patch(f"{OUR_API}/chats/{chat_id}", json={"ended_at": event_at})
+
+        def _patch(agent_id: Optional[str] = None) -> Response:
+            data = {"ended_at": event_at}
+            if agent_id is not None:
+                data["agent_id"] = agent_id
+            with tracer.span("write", "PATCH /chats/{id}"):
+                return our_api_client.patch(f"/chats/{chat_id}", json=data)
+
+        response = _patch() if new_advisor is None else write_as_agent(new_advisor, logger, _patch)
         response.raise_for_status()
+        # the chat won't be needed anymore, keep it only a little longer for late events
+        chat_cache.set(conversation_id, chat_id, ttl=CHAT_CACHE_END_GRACE)
         logger.info(f"{EVENT_END_LOG} Ended chat {chat_id}")
     else:
         logger.warning(f"{EVENT_END_LOG} Chat not found")
 
 
 def _create_message(conversation_id: int, message: str, event_at: int, logger: Any) -> None:
+    """
+    Messages are written at least once: OurAPI has no key to tell a retried POST apart, so a
+    retry after a timeout whose request was committed anyway duplicates the message.
+    """
     chat_id = search_chat(conversation_id)
     if chat_id:
-        response = requests.post(f"{OUR_API}/chats/{chat_id}/messages", json={"sent_at": event_at, "text": message})
-        response.raise_for_status()
+        with tracer.span("write", "POST /chats/{id}/messages"):
+            response = our_api_client.post(f"/chats/{chat_id}/messages", json={"sent_at": event_at, "text": message})
+            response.raise_for_status()
         logger.info(f"{EVENT_MESSAGE_LOG} Create message for chat {chat_id}")
     else:
         logger.warning(f"{EVENT_MESSAGE_LOG} Chat not found")
@@ -43,26 +94,39 @@ def _create_message(conversation_id: int, message: str, event_at: int, logger: A
 def _transfer_chat(external_id: int, new_advisor: int, logger: Any) -> None:
     chat_id = search_chat(external_id)
     if chat_id:
-        new_agent_id = search_or_create_agent(new_advisor, logger)
-        response = requests.patch(f"{OUR_API}/chats/{chat_id}", json={"agent_id": new_agent_id})
+
+        def _patch(agent_id: str) -> Response:
+            with tracer.span("write", "PATCH /chats/{id}"):
+                return our_api_client.patch(f"/chats/{chat_id}", json={"agent_id": agent_id})
+
+        response = write_as_agent(new_advisor, logger, _patch)
         response.raise_for_status()
         logger.info(f"{EVENT_TRANSFER_LOG} Update agent from chat {chat_id}")
     else:
         logger.warning(f"{EVENT_TRANSFER_LOG} Chat not found")
 
 
-def process_events(events: List, logger: Any) -> None:
-    event_counts = Counter(event["event_name"] for event in events)
+def log_summary(events: List, logger: Any) -> None:
+    event_counts = Counter(event.event_name for event in events)
     summary = ", ".join([f"{count} {event_name}" for event_name, count in event_counts.items()])
     logger.info(f"Found the following events: {summary}")
 
+
+def process_event(event: Event, logger: Any) -> None:
+    match event:
+        case StartEvent():
+            _create_chat(event.conversation_id, event.event_at, logger, event.ended_at, event.new_advisor_id)
+        case EndEvent():
+            _end_chat(event.conversation_id, event.event_at, logger, event.new_advisor_id)
+        case MessageEvent():
+            _create_message(event.conversation_id, event.message, event.event_at, logger)
+        case TransferEvent():
+            _transfer_chat(event.conversation_id, event.new_advisor_id, logger)
+
+
+def process_events(events: List, logger: Any) -> None:
+    events = parse_events(events, logger)
+    log_summary(events, logger)
+
     for event in events:
-        match event["event_name"]:
-            case constants.EVENT_START:
-                _create_chat(event["conversation_id"], event["event_at"], logger)
-            case constants.EVENT_END:
-                _end_chat(event["conversation_id"], event["event_at"], logger)
-            case constants.EVENT_MESSAGE:
-                _create_message(event["conversation_id"], event["data"]["message"], event["event_at"], logger)
-            case constants.EVENT_TRANSFER:
-                _transfer_chat(event["conversation_id"], event["data"]["new_advisor_id"], logger)
+        process_event(event, logger)
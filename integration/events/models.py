@@ -0,0 +1,133 @@
+import re
+from dataclasses import MISSING, dataclass, fields
+from typing import Any, ClassVar, Dict, Iterable, List, Optional, Type
+
+from integration.events import constants
+from integration.metrics import events_invalid
+
+INTEGER = re.compile(r"-?[0-9]+")
+# OurAPI rejects shorter messages once surrounding whitespace is stripped
+MESSAGE_MIN_LENGTH = 2
+
+
+class InvalidEvent(ValueError):
+    """The event coming from BigChat doesn't have the shape expected for its name"""
+
+
+@dataclass(slots=True, frozen=True)
+class Event:
+    conversation_id: int
+    event_at: int
+
+    # shared by every instance of a type so the name is never stored per event
+    event_name: ClassVar[str]
+    _data: ClassVar[tuple] = ()  # fields coming from BigChat's data object
+
+    def to_dict(self) -> dict:
+        """Back to BigChat's shape, for what has to be stored or sent as JSON"""
+        event = {"event_name": self.event_name, "conversation_id": self.conversation_id, "event_at": self.event_at}
+        data = {name: value for name in self._data if (value := getattr(self, name)) is not None}
+        if data:
+            event["data"] = data
+        return event
+
+
+@dataclass(slots=True, frozen=True)
+class StartEvent(Event):
+    # known up front when later events of the conversation were coalesced into the START
+    ended_at: Optional[int] = None
+    new_advisor_id: Optional[int] = None
+
+    event_name: ClassVar[str] = constants.EVENT_START
+    _data: ClassVar[tuple] = ("ended_at", "new_advisor_id")
+
+
+@dataclass(slots=True, frozen=True)
+class EndEvent(Event):
+    new_advisor_id: Optional[int] = None  # set when a TRANSFER was coalesced into the END
+
+    event_name: ClassVar[str] = constants.EVENT_END
+    _data: ClassVar[tuple] = ("new_advisor_id",)
+
+
+@dataclass(slots=True, frozen=True)
+class MessageEvent(Event):
+    message: str
+
+    event_name: ClassVar[str] = constants.EVENT_MESSAGE
+    _data: ClassVar[tuple] = ("message",)
+
+
+@dataclass(slots=True, frozen=True)
+class TransferEvent(Event):
+    new_advisor_id: int
+
+    event_name: ClassVar[str] = constants.EVENT_TRANSFER
+    _data: ClassVar[tuple] = ("new_advisor_id",)
+
+
+EVENT_TYPES: Dict[str, Type[Event]] = {
+    event_type.event_name: event_type for event_type in (StartEvent, EndEvent, MessageEvent, TransferEvent)
+}
+_REQUIRED = {
+    event_type: {field.name for field in fields(event_type) if field.default is MISSING}
+    for event_type in EVENT_TYPES.values()
+}
+
+
+def _integer(value: Any, name: str) -> int:
+    # BigChat ids and timestamps are integers, sometimes sent as strings
+    if isinstance(value, bool):
+        raise InvalidEvent(f"{name} must be an integer, got {value!r}")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and INTEGER.fullmatch(value.strip()):
+        return int(value)
+    raise InvalidEvent(f"{name} must be an integer, got {value!r}")
+
+
+def parse_event(raw: Any) -> Event:
+    """Build the typed event once, checking everything its handler will need"""
+    if isinstance(raw, Event):
+        return raw
+    if not isinstance(raw, dict):
+        raise InvalidEvent(f"Expected an object, got {type(raw).__name__}")
+
+    event_type = EVENT_TYPES.get(raw.get("event_name"))
+    if event_type is None:
+        raise InvalidEvent(f"Unknown event name {raw.get('event_name')!r}")
+    data = raw.get("data") or {}
+    if not isinstance(data, dict):
+        raise InvalidEvent(f"data must be an object, got {type(data).__name__}")
+
+    values = {
+        "conversation_id": _integer(raw.get("conversation_id"), "conversation_id"),
+        "event_at": _integer(raw.get("event_at"), "event_at"),
+    }
+    for name in event_type._data:
+        value = data.get(name)
+        if value is None:
+            if name in _REQUIRED[event_type]:
+                raise InvalidEvent(f"{event_type.event_name} needs data.{name}")
+            continue
+        if name == "message":
+            if not isinstance(value, str):
+                raise InvalidEvent(f"data.message must be a string, got {value!r}")
+            if len(value.strip()) < MESSAGE_MIN_LENGTH:
+                raise InvalidEvent(f"data.message needs at least {MESSAGE_MIN_LENGTH} characters, got {value!r}")
+            values[name] = value
+        else:
+            values[name] = _integer(value, f"data.{name}")
+    return event_type(**values)
+
+
+def parse_events(raw_events: Iterable, logger: Any) -> List[Event]:
+    """Typed events, the invalid ones are logged and dropped so they can't fail halfway through a window"""
+    events = []
+    for raw in raw_events:
+        try:
+            events.append(parse_event(raw))
+        except InvalidEvent as exception:
+            events_invalid.inc()
+            logger.error(f"Dropping invalid event {raw!r}: {exception}")
+    return events
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, List
+
+from integration.constants import PENDING_MAX_CONVERSATIONS, PENDING_TIMEOUT
+from integration.events.models import Event
+from integration.metrics import events_held, pending_events_gauge
+
+
+class PendingEvents:
+    """
+    Events that arrived before the START of their conversation was applied,
+    they wait here until the START shows up or until `timeout` seconds pass.
+    At most `max_conversations` wait at once, the oldest ones time out first
+    """
+
+    def __init__(
+        self,
+        timeout: float = PENDING_TIMEOUT,
+        max_conversations: int = PENDING_MAX_CONVERSATIONS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.timeout = timeout
+        self.max_conversations = max_conversations
+        self.clock = clock
+        self._events = OrderedDict()  # conversation id -> (held since, events)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sorted(events: List) -> List:
+        return sorted(events, key=lambda event: event.event_at)
+
+    def _update_gauge(self) -> None:
+        pending_events_gauge.set(sum(len(events) for _, events in self._events.values()))
+
+    def has(self, conversation_id: Hashable) -> bool:
+        return conversation_id in self._events
+
+    def hold(self, event: Event) -> None:
+        with self._lock:
+            _, events = self._events.setdefault(event.conversation_id, (self.clock(), []))
+            events.append(event)
+            self._update_gauge()
+        events_held.inc(event_name=event.event_name)
+
+    def release(self, conversation_id: Hashable) -> List:
+        """Events held for the conversation in event_at order"""
+        with self._lock:
+            _, events = self._events.pop(conversation_id, (None, []))
+            self._update_gauge()
+        return self._sorted(events)
+
+    def expired(self) -> List[List]:
+        """Take out the conversations that waited too long, one list of events in event_at order each"""
+        now = self.clock()
+        lanes = []
+        with self._lock:
+            while self._events:
+                conversation_id, (held_since, events) = next(iter(self._events.items()))
+                if now - held_since < self.timeout and len(self._events) <= self.max_conversations:
+                    break
+                del self._events[conversation_id]
+                lanes.append(self._sorted(events))
+            self._update_gauge()
+        return lanes
+
+    def expire_all(self) -> List[List]:
+        """Take out every conversation however long it waited, for when no START can arrive anymore"""
+        with self._lock:
+            lanes = [self._sorted(events) for _, events in self._events.values()]
+            self._events.clear()
+            self._update_gauge()
+        return lanes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._events.clear()
+            self._update_gauge()
+
+    def __len__(self) -> int:
+        return sum(len(events) for _, events in self._events.values())
+
+
+pending_events = PendingEvents()
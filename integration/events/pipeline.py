@@ -0,0 +1,159 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from integration.constants import COALESCE_EVENTS, MAX_CONCURRENCY
+from integration.dead_letter import DeadLetterQueue, dead_letters
+from integration.events.coalesce import coalesce_lane
+from integration.events.events import log_summary, process_event
+from integration.events.models import Event, StartEvent, parse_events
+from integration.events.pending import PendingEvents, pending_events
+from integration.events.utils import chat_cache
+from integration.metrics import event_seconds, events_received
+from integration.retry import retry
+from integration.tracing import profiler, tracer
+
+
+def group_by_conversation(events: List) -> Dict[int, List]:
+    """Split events into one lane per conversation keeping their original order"""
+    lanes = defaultdict(list)
+    for event in events:
+        lanes[event.conversation_id].append(event)
+    return lanes
+
+
+def _timed_process_event(event: Event, logger: Any) -> None:
+    started_at = time.perf_counter()
+    try:
+        with tracer.span("event", event.event_name, conversation_id=event.conversation_id):
+            profiler.run(retry, process_event, event, logger)
+    finally:
+        event_seconds.observe(time.perf_counter() - started_at, event_name=event.event_name)
+
+
+def _must_wait(event: Event, pending: PendingEvents) -> bool:
+    """Events whose chat was not created yet wait for the START, so do the ones queued behind them"""
+    conversation_id = event.conversation_id
+    if isinstance(event, StartEvent):
+        return False
+    return conversation_id not in chat_cache or pending.has(conversation_id)
+
+
+async def _process_lane(
+    lane: List,
+    executor: ThreadPoolExecutor,
+    logger: Any,
+    dead_letter_queue: Optional[DeadLetterQueue],
+    pending: Optional[PendingEvents] = None,
+) -> None:
+    """
+    Process the events of a single conversation strictly one after another,
+    with a pending buffer events arriving before their START are held in it
+    and processed right after the START
+    """
+    loop = asyncio.get_running_loop()
+    queue = deque(lane)
+    while queue:
+        event = queue.popleft()
+        conversation_id = event.conversation_id
+        if pending is not None and _must_wait(event, pending):
+            pending.hold(event)
+            continue
+        try:
+            await loop.run_in_executor(executor, _timed_process_event, event, logger)
+        except Exception as exception:
+            if dead_letter_queue is None:
+                raise
+            # the rest of the conversation goes along so a replay keeps its order
+            failed_events = [event, *queue, *(pending.release(conversation_id) if pending is not None else [])]
+            logger.error(
+                f"Failed to process {event.event_name} for conversation {conversation_id}, "
+                f"{len(failed_events)} event(s) sent to the dead letter queue: {exception!r}"
+            )
+            for failed_event in failed_events:
+                dead_letter_queue.put(failed_event.to_dict(), repr(exception))
+            return
+        if pending is not None and isinstance(event, StartEvent):
+            # the held events happened before the ones still in the lane
+            queue.extendleft(reversed(pending.release(conversation_id)))
+
+
+async def process_events_async(
+    events: List,
+    logger: Any,
+    max_concurrency: int = MAX_CONCURRENCY,
+    coalesce: bool = COALESCE_EVENTS,
+    dead_letter_queue: Optional[DeadLetterQueue] = dead_letters,
+    pending: Optional[PendingEvents] = pending_events,
+    flush: bool = False,
+) -> None:
+    """
+    Process events of different conversations at the same time while keeping
+    the order of the events inside each conversation. Malformed events are
+    dropped before anything is sent to OurAPI. Events failing after
+    every retry go to the dead letter queue, or are raised when there is none.
+    Events arriving before the START of their conversation wait in `pending`,
+    once they waited too long, or when flushing, their chat is looked up in OurAPI instead
+    """
+    events = parse_events(events, logger)
+    log_summary(events, logger)
+    for event in events:
+        events_received.inc(event_name=event.event_name)
+
+    lanes = list(group_by_conversation(events).values())
+    if coalesce:
+        lanes = [coalesce_lane(lane) for lane in lanes]
+        coalesced = sum(len(lane) for lane in lanes)
+        if coalesced < len(events):
+            logger.info(f"Coalesced {len(events)} events into {coalesced}")
+
+    # the handlers are blocking so they run in a pool, its size caps the concurrency
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        results = await asyncio.gather(
+            *(_process_lane(lane, executor, logger, dead_letter_queue, pending) for lane in lanes),
+            return_exceptions=True,
+        )
+        expired = []
+        if pending is not None:
+            expired = pending.expire_all() if flush else pending.expired()
+        if expired:
+            logger.warning(f"START not seen for {len(expired)} conversation(s) in time, looking their chats up")
+            results += await asyncio.gather(
+                *(_process_lane(lane, executor, logger, dead_letter_queue) for lane in expired),
+                return_exceptions=True,
+            )
+
+    # drop the chats whose grace period after END is over
+    chat_cache.purge()
+
+    # let every lane finish before surfacing the first error found
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+def run_events(
+    events: List,
+    logger: Any,
+    max_concurrency: int = MAX_CONCURRENCY,
+    coalesce: bool = COALESCE_EVENTS,
+    dead_letter_queue: Optional[DeadLetterQueue] = dead_letters,
+    pending: Optional[PendingEvents] = pending_events,
+    flush: bool = False,
+) -> None:
+    """Blocking entry point for the asyncio pipeline"""
+    asyncio.run(process_events_async(events, logger, max_concurrency, coalesce, dead_letter_queue, pending, flush))
+
+
+def flush_pending(
+    logger: Any,
+    max_concurrency: int = MAX_CONCURRENCY,
+    dead_letter_queue: Optional[DeadLetterQueue] = dead_letters,
+    pending: PendingEvents = pending_events,
+) -> None:
+    """Process every held event without waiting for its START, before a run ends and the buffer is lost"""
+    if len(pending):
+        logger.info(f"Flushing {len(pending)} held event(s)")
+        run_events([], logger, max_concurrency, dead_letter_queue=dead_letter_queue, pending=pending, flush=True)
@@ -1,54 +1,207 @@
-from typing import Any, Optional
+import threading
+from contextlib import contextmanager
+from http import HTTPStatus
+from typing import Any, Callable, Optional
 
-import requests
+from requests import HTTPError, Response
 
-from integration.constants import BIG_CHAT_API, OUR_API
+from integration.cache import LRUCache
+from integration.client import big_chat_client, our_api_client
+from integration.constants import (ADVISOR_CACHE_SIZE, ADVISOR_CACHE_TTL,
+                                   AGENT_CACHE_SIZE, AGENT_CACHE_TTL,
+                                   CHAT_CACHE_SIZE, MISSING_CHAT_CACHE_SIZE,
+                                   MISSING_CHAT_CACHE_TTL,
+                                   OUR_API_NEXT_CURSOR_HEADER,
+                                   WARM_UP_PAGE_SIZE)
+from integration.metrics import chat_lookup_misses, registry
+from integration.tracing import tracer
 
-chat_cache = {}  # rudimentary cache for chat ID resolution
+chat_cache = LRUCache(CHAT_CACHE_SIZE)  # conversation id -> OurAPI chat id
+missing_chat_cache = LRUCache(MISSING_CHAT_CACHE_SIZE, MISSING_CHAT_CACHE_TTL)  # conversation ids without chat
+advisor_cache = LRUCache(ADVISOR_CACHE_SIZE, ADVISOR_CACHE_TTL)  # advisor id -> BigChat advisor profile
+agent_cache = LRUCache(AGENT_CACHE_SIZE, AGENT_CACHE_TTL)  # advisor id -> OurAPI agent id
+agent_email_cache = LRUCache(AGENT_CACHE_SIZE, AGENT_CACHE_TTL)  # agent email -> OurAPI agent id
+_agent_locks = {}  # advisor id -> (lock, threads holding or waiting for it)
+_agent_locks_lock = threading.Lock()
 
+for name, cache in (
+    ("chat", chat_cache),
+    ("missing_chat", missing_chat_cache),
+    ("advisor", advisor_cache),
+    ("agent", agent_cache),
+    ("agent_email", agent_email_cache),
+):
+    registry.register_cache(name, cache)
 
+
+@tracer.traced("resolve")
 def search_chat(conversation_id: int) -> Optional[str]:
     """Given a chat id from BigChat find the corresponding id from OutApi"""
     # check if the result is already cached
-    if conversation_id in chat_cache:
-        return chat_cache[conversation_id]
+    chat_id = chat_cache.get(conversation_id)
+    if chat_id:
+        return chat_id
+    # a recent lookup already found nothing
+    if missing_chat_cache.get(conversation_id):
+        return None
 
     # if not in cache, make the API request
-    response = requests.get(f"{OUR_API}/chats?external_id={str(conversation_id)}")
+    response = our_api_client.get(f"/chats?external_id={str(conversation_id)}")
     response.raise_for_status()
     response = response.json()
 
     if len(response) == 1:
         chat_id = response[0]["chat_id"]
-        chat_cache[conversation_id] = chat_id  # store in cache
+        chat_cache.set(conversation_id, chat_id)  # store in cache
         return chat_id
 
+    missing_chat_cache.set(conversation_id, True)
+    chat_lookup_misses.inc()
+
+
+@tracer.traced("resolve")
+def get_advisor(advisor_id: int) -> dict:
+    """Get the BigChat profile of an advisor, hitting BigChat only on cache misses"""
+    advisor = advisor_cache.get(advisor_id)
+    if advisor is None:
+        response = big_chat_client.get(f"/advisors/{advisor_id}")
+        response.raise_for_status()
+        advisor = response.json()
+        advisor_cache.set(advisor_id, advisor)
+    return advisor
+
+
+def _search_agent(email: str) -> Optional[str]:
+    agent_id = agent_email_cache.get(email)
+    if agent_id:
+        return agent_id
+
+    response = our_api_client.get(f"/agents?email={email}")
+    response.raise_for_status()
+    if response.json():
+        agent_id = response.json()[0]["agent_id"]
+        agent_email_cache.set(email, agent_id)
+        return agent_id
+
+
+def _create_agent(advisor_id: int, logger: Any) -> str:
+    advisor = get_advisor(advisor_id)
+    email = advisor["email_address"]
+    name = advisor["name"]
+
+    agent_id = _search_agent(email)
+    if agent_id:  # if the agent exists
+        return agent_id
+
+    # if not, then create it
+    response = our_api_client.post("/agents", json={"name": name, "email": email})
+    if response.status_code == HTTPStatus.CONFLICT:
+        # somebody else created it meanwhile, drop what we know and look it up again
+        advisor_cache.pop(advisor_id)
+        agent_id = _search_agent(get_advisor(advisor_id)["email_address"])
+        if agent_id:
+            return agent_id
+
+    try:
+        response.raise_for_status()
+    except HTTPError:
+        # the profile may be stale so it's fetched again on the next attempt
+        advisor_cache.pop(advisor_id)
+        raise
+
+    agent_id = response.json()["agent_id"]
+    logger.info(f"\x1b[35mEXTRA\x1b[0m Create user {agent_id}")
+    return agent_id
+
+
+@contextmanager
+def _agent_lock(advisor_id: int):
+    """Serialize the resolutions of one advisor, the lock is dropped once nobody needs it"""
+    with _agent_locks_lock:
+        lock, users = _agent_locks.get(advisor_id, (None, 0))
+        lock = lock or threading.Lock()
+        _agent_locks[advisor_id] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _agent_locks_lock:
+            lock, users = _agent_locks[advisor_id]
+            if users == 1:
+                del _agent_locks[advisor_id]
+            else:
+                _agent_locks[advisor_id] = (lock, users - 1)
 
+
+@tracer.traced("resolve")
 def search_or_create_agent(advisor_id: int, logger: Any) -> str:
     """
     Given an advisor id from BigChat find the corresponding id from OutApi
     or create the agent if not found
     """
-    response = requests.get(f"{BIG_CHAT_API}/advisors/{advisor_id}")
-    response.raise_for_status()
-    email = response.json()["email_address"]
-    name = response.json()["name"]
+    agent_id = agent_cache.get(advisor_id)
+    if agent_id is None:
+        # resolutions of an advisor are serialized so concurrent events don't create the same agent twice
+        with _agent_lock(advisor_id):
+            agent_id = agent_cache.peek(advisor_id)
+            if agent_id is None:
+                agent_id = _create_agent(advisor_id, logger)
+                agent_cache.set(advisor_id, agent_id)
+    return agent_id
 
-    response = requests.get(f"{OUR_API}/agents?email={email}")
-    response.raise_for_status()
 
-    if response.json():  # if the agent exists
-        return response.json()[0]["agent_id"]
-    else:  # if not, then create it
-        response = requests.post(f"{OUR_API}/agents", json={"name": name, "email": email})
-        response.raise_for_status()
-        agent_id = response.json()["agent_id"]
-        logger.info(f"\x1b[35mEXTRA\x1b[0m Create user {agent_id}")
-        return agent_id
+def forget_agent(advisor_id: int) -> None:
+    """Drop the cached agent of the advisor, by advisor and by email"""
+    agent_cache.pop(advisor_id)
+    advisor = advisor_cache.peek(advisor_id)
+    if advisor is not None:
+        agent_email_cache.pop(advisor["email_address"])
+
+
+def write_as_agent(advisor_id: int, logger: Any, write: Callable[[str], Response]) -> Response:
+    """
+    Send a chat write setting the agent of the advisor. OurAPI answers 400 to agents it doesn't know,
+    which cached ones become when it loses its data (e.g. an in-memory database restarted), so the
+    agent is forgotten and resolved again once.
+    """
+    response = write(search_or_create_agent(advisor_id, logger))
+    if response.status_code == HTTPStatus.BAD_REQUEST:
+        forget_agent(advisor_id)
+        response = write(search_or_create_agent(advisor_id, logger))
+    return response
 
 
+@tracer.traced("resolve")
 def search_advisor(conversation_id: int) -> int:
     """Get the advisor id for given chat"""
-    response = requests.get(f"{BIG_CHAT_API}/conversations/{conversation_id}")
+    response = big_chat_client.get(f"/conversations/{conversation_id}")
     response.raise_for_status()
     return response.json()["advisor_id"]
+
+
+def warm_up_caches(logger: Any) -> None:
+    """Pre-populate the caches with the agents and open chats that already exist in OurAPI"""
+    response = our_api_client.get("/agents")
+    response.raise_for_status()
+    agents = response.json()
+    for agent in agents:
+        agent_email_cache.set(agent["email"], agent["agent_id"])
+
+    # ended chats won't receive events anymore, only open ones are worth caching
+    params = {"open_only": "true", "limit": WARM_UP_PAGE_SIZE}
+    while True:
+        response = our_api_client.get("/chats", params=params)
+        response.raise_for_status()
+        # pages come in started_at order so the newest chats end up as the most recently used
+        for chat in response.json():
+            try:
+                conversation_id = int(chat["external_id"])
+            except ValueError:  # not a BigChat conversation
+                continue
+            chat_cache.set(conversation_id, chat["chat_id"])
+        cursor = response.headers.get(OUR_API_NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+        params = {**params, "cursor": cursor}
+
+    logger.info(f"Warmed up caches with {len(agents)} agent(s) and {len(chat_cache)} chat(s)")
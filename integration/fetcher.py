@@ -0,0 +1,122 @@
+import queue
+import threading
+from itertools import islice
+from typing import Iterator, List, Optional
+
+from requests import HTTPError, Response
+
+from integration.client import big_chat_client
+from integration.constants import (PREFETCH_PAGES, STREAM_BATCH_SIZE,
+                                   STREAM_CHUNK_SIZE, STREAM_EVENTS)
+from integration.retry import retry
+from integration.stream import EventStream
+from integration.tracing import profiler, tracer
+
+_DONE = object()  # marks that there are no more pages
+
+
+def _fetch_page(url: str, **kwargs) -> dict:
+    with tracer.span("fetch", "GET /events"):
+        response = big_chat_client.get(url, **kwargs)
+        response.raise_for_status()
+    with tracer.span("parse", "decode page"):
+        return response.json()
+
+
+def _open_page(url: str, **kwargs) -> Response:
+    with tracer.span("fetch", "GET /events"):
+        response = big_chat_client.get(url, stream=True, **kwargs)
+    try:
+        response.raise_for_status()
+    except HTTPError:
+        response.close()
+        raise
+    return response
+
+
+def _put(pages: queue.Queue, item, stop: threading.Event) -> bool:
+    """Wait for room in the read-ahead buffer unless the consumer went away"""
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _stream_page(url: str, pages: queue.Queue, stop: threading.Event, batch_size: int, **kwargs) -> Optional[str]:
+    """Hand over the events of a page in batches while it's being downloaded, returns the next page URL"""
+    with retry(_open_page, url, **kwargs) as response:
+        stream = EventStream(response.iter_content(STREAM_CHUNK_SIZE))
+        events = iter(stream)
+        while True:
+            # the download of the page happens while it's parsed
+            with tracer.span("parse", "stream page"):
+                batch = list(islice(events, batch_size))
+            if not batch:
+                return stream.next_page_url
+            if not _put(pages, batch, stop):
+                return None
+
+
+def _produce(start_at, end_at, pages: queue.Queue, stop: threading.Event, stream: bool, batch_size: int) -> None:
+    params = {"start_at": start_at, "end_at": end_at}
+    try:
+        if stream:
+            next_page_url = _stream_page("/events", pages, stop, batch_size, params=params)
+            while next_page_url:
+                next_page_url = _stream_page(next_page_url, pages, stop, batch_size)
+            return
+
+        response_data = retry(_fetch_page, "/events", params=params)
+        while _put(pages, response_data["events"], stop):
+            # the next page is requested as soon as its URL is known
+            next_page_url = response_data.get("nextPageUrl")
+            if not next_page_url:
+                break
+            response_data = retry(_fetch_page, next_page_url)
+    except Exception as exception:  # handed over to the consumer
+        _put(pages, exception, stop)
+    finally:
+        _put(pages, _DONE, stop)
+
+
+def fetch_pages(
+    start_at,
+    end_at,
+    read_ahead: int = PREFETCH_PAGES,
+    stream: bool = STREAM_EVENTS,
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> Iterator[List]:
+    """
+    Yield the events of every BigChat page in the window, next pages are fetched
+    in the background while the current one is processed keeping at most
+    `read_ahead` pages buffered. When streaming, pages are parsed as they are
+    downloaded and yielded in batches of up to `batch_size` events instead
+    """
+    pages = queue.Queue(maxsize=read_ahead)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=profiler.run, args=(_produce, start_at, end_at, pages, stop, stream, batch_size), daemon=True
+    )
+    producer.start()
+    try:
+        while (page := pages.get()) is not _DONE:
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        stop.set()
+        producer.join()
+
+
+def fetch_window(start_at, end_at) -> List:
+    """Every event in the window following its pages one after another, for callers fetching many windows at once"""
+    events = []
+    response_data = retry(_fetch_page, "/events", params={"start_at": start_at, "end_at": end_at})
+    events += response_data["events"]
+    while next_page_url := response_data.get("nextPageUrl"):
+        response_data = retry(_fetch_page, next_page_url)
+        events += response_data["events"]
+    return events
@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class AdaptiveLimiter:
+    """
+    Caps the requests in flight to a downstream and adapts the cap AIMD style:
+    while the smoothed latency and error rate stay under `target_latency` and
+    `max_error_rate` the limit grows by one per round of `limit` responses, when
+    either goes over it is cut by `backoff` (at most once per `cooldown` seconds
+    so a burst of slow or failed responses only counts once). Optionally requests
+    are also paced so they never go over `max_rps` per second
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency: float,
+        max_error_rate: float = 0.1,
+        backoff: float = 0.5,
+        cooldown: Optional[float] = None,
+        max_rps: Optional[float] = None,
+        smoothing: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.backoff = backoff
+        self.cooldown = target_latency if cooldown is None else cooldown
+        self.max_rps = max_rps
+        self.smoothing = smoothing
+        self.clock = clock
+        self.sleep = sleep
+        self.in_flight = 0
+        self.latency = 0.0  # exponentially weighted moving average
+        self.error_rate = 0.0  # exponentially weighted moving average
+        self._last_decrease = float("-inf")
+        self._next_slot = float("-inf")
+        self._condition = threading.Condition()
+
+    def _pace(self) -> None:
+        with self._condition:
+            now = self.clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.max_rps
+        if slot > now:
+            self.sleep(slot - now)
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        if self.max_rps:
+            self._pace()
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self.latency += self.smoothing * (latency - self.latency)
+            self.error_rate += self.smoothing * (failed - self.error_rate)
+
+            if self.error_rate > self.max_error_rate or self.latency > self.target_latency:
+                now = self.clock()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
@@ -1,10 +1,25 @@
+import argparse
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Optional
 
-import requests
+from requests import RequestException
 
-from integration.constants import BIG_CHAT_API, DELTA_SECONDS
-from integration.events.events import process_events
+from integration.backfill import backfill
+from integration.constants import (BACKFILL_FETCH_CONCURRENCY, CATCH_UP_POLICY,
+                                   DELTA_SECONDS, MAX_CONCURRENCY,
+                                   METRICS_DUMP_INTERVAL, PROFILE_WINDOWS,
+                                   SHARDS, STREAM_EVENTS)
+from integration.dead_letter import dead_letters
+from integration.events.pipeline import flush_pending, run_events
+from integration.events.utils import warm_up_caches
+from integration.fetcher import fetch_pages
+from integration.metrics import (observe_window, start_metrics_server,
+                                 start_snapshot_dump)
+from integration.scheduler import CATCH_UP_POLICIES, windows
+from integration.sharding import ShardedRunner
+from integration.tracing import profiler, tracer
 
 FORMAT = "%(asctime)s | %(levelname)-5s | %(message)s"
 
@@ -13,28 +28,140 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-def main(start_at, end_at):
+def main(start_at, end_at, max_concurrency=MAX_CONCURRENCY, stream=STREAM_EVENTS):
     logger.info(f"Retrieving BigChat events from {start_at} to {end_at}")
-    response = requests.get(f"{BIG_CHAT_API}/events", params={"start_at": start_at, "end_at": end_at})
-    response.raise_for_status()
-    response_data = response.json()
-    process_events(response_data["events"], logger)
+    with tracer.span("window", f"{start_at} - {end_at}"):
+        # pages after the first one are prefetched while the current one is processed
+        for events in fetch_pages(start_at, end_at, stream=stream):
+            run_events(events, logger, max_concurrency)
+    observe_window(end_at)
 
-    # if more pages are found we process also those
-    next_page_url = response_data.get("nextPageUrl")
-    while next_page_url:
-        response = requests.get(next_page_url)
-        response.raise_for_status()
-        response_data = response.json()
-        process_events(response_data["events"], logger)
-        next_page_url = response_data.get("nextPageUrl")
 
+def replay_dead_letters(max_concurrency=MAX_CONCURRENCY) -> None:
+    """Process again the events in the dead letter queue, the ones failing again go back to it"""
+    with dead_letters.drain() as entries:
+        logger.info(f"Replaying {len(entries)} event(s) from the dead letter queue")
+        if entries:
+            run_events([entry["event"] for entry in entries], logger, max_concurrency)
+            flush_pending(logger, max_concurrency)
+    logger.info(f"{len(dead_letters)} event(s) left in the dead letter queue")
 
-if __name__ == "__main__":
-    end_at = datetime.now()
+
+def follow(run_window: Callable, catch_up: str, stream: bool, max_windows: Optional[int] = None) -> None:
+    """Process a window every DELTA_SECONDS, forever or max_windows times, a failing one doesn't stop the next"""
     logger.info(f"Give me {DELTA_SECONDS}s please")
-    while True:
-        if datetime.now() >= end_at + timedelta(seconds=DELTA_SECONDS):
-            start_at = end_at
-            end_at = start_at + timedelta(seconds=DELTA_SECONDS)
-            main(start_at, end_at)
+    try:
+        for start_at, end_at in islice(windows(datetime.now(), DELTA_SECONDS, catch_up, logger=logger), max_windows):
+            try:
+                run_window(start_at, end_at, stream=stream)
+            except Exception:
+                logger.exception(f"Failed to process window from {start_at} to {end_at}")
+    finally:
+        # held events would be lost on shutdown, the sharded workers flush their own
+        flush_pending(logger)
+
+
+def profile(trace_path: str, max_windows: int, stats_path: Optional[str], catch_up: str, stream: bool) -> None:
+    """Follow max_windows windows recording a trace of every stage and optionally cProfile stats"""
+    tracer.enable()
+    if stats_path:
+        profiler.enable()
+    try:
+        profiler.run(follow, main, catch_up, stream, max_windows)
+    finally:
+        tracer.write(trace_path)
+        logger.info(f"Trace written to {trace_path}, open it in chrome://tracing or https://ui.perfetto.dev")
+        if stats_path:
+            profiler.dump(stats_path)
+            logger.info(f"cProfile stats written to {stats_path}, inspect them with python -m pstats {stats_path}")
+
+
+def warm_up() -> None:
+    try:
+        warm_up_caches(logger)
+    except RequestException as exception:  # not fatal, caches will fill up as events come
+        logger.warning(f"Could not warm up caches: {exception}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="BigChat to OurAPI integration")
+    parser.add_argument(
+        "--catch-up",
+        choices=CATCH_UP_POLICIES,
+        default=CATCH_UP_POLICY,
+        help="how to process the windows missed when processing falls behind",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=STREAM_EVENTS,
+        help="parse BigChat responses incrementally, processing events as they arrive",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=SHARDS,
+        help="worker processes to partition events across by conversation",
+    )
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this local port")
+    parser.add_argument(
+        "--metrics-dump",
+        metavar="PATH",
+        help=f"write a JSON snapshot of the metrics to PATH every {METRICS_DUMP_INTERVAL}s",
+    )
+    parser.add_argument(
+        "--backfill",
+        nargs=2,
+        type=datetime.fromisoformat,
+        metavar=("START_AT", "END_AT"),
+        help=f"import the events between two past ISO dates in {DELTA_SECONDS}s windows and exit",
+    )
+    parser.add_argument(
+        "--backfill-concurrency",
+        type=int,
+        default=BACKFILL_FETCH_CONCURRENCY,
+        help="windows fetched from BigChat at the same time when backfilling",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="TRACE_PATH",
+        help="run --profile-windows windows in a single process and write a Chrome trace of their stages to TRACE_PATH",
+    )
+    parser.add_argument(
+        "--profile-windows",
+        type=int,
+        default=PROFILE_WINDOWS,
+        help="windows to run when profiling",
+    )
+    parser.add_argument("--cprofile", metavar="STATS_PATH", help="also write cProfile stats when profiling")
+    parser.add_argument(
+        "--replay-dead-letters",
+        action="store_true",
+        help="process the events in the dead letter queue and exit",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+        logger.info(f"Serving metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+    if args.metrics_dump:
+        start_snapshot_dump(args.metrics_dump, METRICS_DUMP_INTERVAL)
+    if args.replay_dead_letters:
+        warm_up()
+        replay_dead_letters()
+    elif args.profile:
+        warm_up()
+        profile(args.profile, args.profile_windows, args.cprofile, args.catch_up, args.stream)
+    elif args.backfill:
+        warm_up()
+        backfill(*args.backfill, logger, fetch_concurrency=args.backfill_concurrency)
+    elif args.shards > 1:
+        # every worker warms up its own caches
+        with ShardedRunner(args.shards, logger) as runner:
+            follow(runner.run_window, args.catch_up, args.stream)
+    else:
+        warm_up()
+        follow(main, args.catch_up, args.stream)
@@ -0,0 +1,260 @@
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# path segments that are identifiers, so /chats/<uuid>/messages is reported as /chats/{id}/messages
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$")
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Tuple[Tuple[str, Any], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterator[Tuple[str, Tuple, float]]:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, labels, value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + (("le", bound),), cumulative
+            yield f"{self.name}_bucket", labels + (("le", "+Inf"),), series[-1]
+            yield f"{self.name}_sum", labels, series[-2]
+            yield f"{self.name}_count", labels, series[-1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    """Metrics of this process plus the caches whose counters are read when rendering"""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.caches = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def register_cache(self, name: str, cache: Any) -> None:
+        """cache must provide stats() with hits, misses, evictions, size and hit_ratio"""
+        self.caches[name] = cache
+
+    def _cache_metrics(self) -> Iterator[_Metric]:
+        stats = {name: cache.stats() for name, cache in self.caches.items()}
+        for field, kind in (("hits", Counter), ("misses", Counter), ("evictions", Counter)):
+            metric = kind(f"integration_cache_{field}_total", f"Cache {field}")
+            for name, values in stats.items():
+                metric.inc(values[field], cache=name)
+            yield metric
+        for field in ("size", "hit_ratio"):
+            metric = Gauge(f"integration_cache_{field}", f"Cache {field.replace('_', ' ')}")
+            for name, values in stats.items():
+                metric.set(values[field], cache=name)
+            yield metric
+
+    def collect(self) -> Iterator[_Metric]:
+        yield from self.metrics.values()
+        yield from self._cache_metrics()
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Every sample as plain data, handy for dumps and benchmarks"""
+        return {
+            metric.name: [
+                {"name": name, "labels": dict(labels), "value": value} for name, labels, value in metric.samples()
+            ]
+            for metric in self.collect()
+        }
+
+    def clear(self) -> None:
+        for metric in self.metrics.values():
+            metric.clear()
+
+
+registry = Registry()
+
+events_received = registry.register(Counter("integration_events_total", "BigChat events received by event name"))
+events_invalid = registry.register(Counter("integration_events_invalid_total", "Malformed events dropped"))
+event_seconds = registry.register(
+    Histogram("integration_event_seconds", "Time spent processing an event by event name")
+)
+http_requests = registry.register(
+    Counter("integration_http_requests_total", "HTTP calls by upstream API, method, endpoint and status")
+)
+http_seconds = registry.register(
+    Histogram("integration_http_request_seconds", "HTTP call latency by upstream API, method and endpoint")
+)
+concurrency_limit = registry.register(
+    Gauge("integration_concurrency_limit", "Requests allowed in flight by the adaptive limiter per upstream API")
+)
+error_rate = registry.register(
+    Gauge("integration_error_rate", "Smoothed share of failed responses seen by the adaptive limiter per upstream API")
+)
+chat_lookup_misses = registry.register(
+    Counter("integration_chat_lookup_misses_total", "Chat lookups in OurAPI that found no chat")
+)
+events_held = registry.register(
+    Counter("integration_events_held_total", "Events held waiting for the START of their conversation")
+)
+pending_events_gauge = registry.register(Gauge("integration_pending_events", "Events waiting for their START"))
+retries = registry.register(Counter("integration_retries_total", "Retries after transient errors by operation"))
+dead_lettered = registry.register(
+    Counter("integration_dead_lettered_total", "Events sent to the dead letter queue by event name")
+)
+window_lag = registry.register(
+    Gauge("integration_window_lag_seconds", "Wall clock time minus the end of the last processed window")
+)
+windows_processed = registry.register(Counter("integration_windows_total", "Windows processed"))
+
+
+def endpoint(url: str) -> str:
+    """Endpoint template of a URL, identifiers and the query string are dropped"""
+    segments = urlsplit(url).path.split("/")
+    return "/".join("{id}" if _ID_SEGMENT.match(segment) else segment for segment in segments) or "/"
+
+
+def observe_http(api: str, method: str, url: str, status: Any, seconds: float) -> None:
+    path = endpoint(url)
+    http_requests.inc(api=api, method=method.upper(), endpoint=path, status=status)
+    http_seconds.observe(seconds, api=api, method=method.upper(), endpoint=path)
+
+
+def observe_window(end_at: Any) -> None:
+    """end_at may be a datetime or anything datetime.fromisoformat understands"""
+    if not isinstance(end_at, datetime):
+        end_at = datetime.fromisoformat(str(end_at))
+    now = datetime.now(end_at.tzinfo)
+    window_lag.set((now - end_at).total_seconds())
+    windows_processed.inc()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # keep the integration logs clean
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the metrics at http://host:port/metrics from a background thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def start_snapshot_dump(path: str, interval: float, stop: Optional[threading.Event] = None) -> threading.Event:
+    """Write a JSON snapshot of the metrics to path every interval seconds"""
+    stop = stop or threading.Event()
+
+    def _dump():
+        while not stop.wait(interval):
+            with open(path, "w") as file:
+                json.dump({"taken_at": time.time(), "metrics": registry.snapshot()}, file)
+
+    threading.Thread(target=_dump, name="metrics-dump", daemon=True).start()
+    return stop
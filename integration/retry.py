@@ -0,0 +1,43 @@
+import random
+import time
+from http import HTTPStatus
+from typing import Any, Callable
+
+from requests import ConnectionError, HTTPError, Timeout
+
+from integration.constants import (RETRY_ATTEMPTS, RETRY_BASE_DELAY,
+                                   RETRY_MAX_DELAY)
+from integration.metrics import retries
+
+
+def is_transient(exception: BaseException) -> bool:
+    """Errors worth trying again: network issues, throttling and server errors (like BigChat's 502)"""
+    if isinstance(exception, (ConnectionError, Timeout)):
+        return True
+    if isinstance(exception, HTTPError) and exception.response is not None:
+        status = exception.response.status_code
+        return status >= 500 or status == HTTPStatus.TOO_MANY_REQUESTS
+    return False
+
+
+def backoff(attempt: int, base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY) -> float:
+    """Exponential backoff with full jitter so retries of concurrent events don't line up"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def retry(
+    function: Callable,
+    *args,
+    attempts: int = RETRY_ATTEMPTS,
+    sleep: Callable[[float], None] = time.sleep,
+    **kwargs,
+) -> Any:
+    """Call function until it succeeds, re-raising non transient errors or the last one"""
+    for attempt in range(1, attempts + 1):
+        try:
+            return function(*args, **kwargs)
+        except Exception as exception:
+            if attempt == attempts or not is_transient(exception):
+                raise
+            retries.inc(function=function.__name__)
+            sleep(backoff(attempt))
@@ -0,0 +1,44 @@
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Tuple
+
+CATCH_UP_SEQUENTIAL = "sequential"  # process every missed window back to back
+CATCH_UP_MERGE = "merge"  # process all the missed windows as a single bigger one
+CATCH_UP_POLICIES = (CATCH_UP_SEQUENTIAL, CATCH_UP_MERGE)
+
+
+def windows(
+    start_at: datetime,
+    delta_seconds: float,
+    policy: str = CATCH_UP_SEQUENTIAL,
+    now: Callable[[], datetime] = datetime.now,
+    sleep: Callable[[float], None] = time.sleep,
+    logger=None,
+) -> Iterator[Tuple[datetime, datetime]]:
+    """
+    Yield (start_at, end_at) windows forever, sleeping until each window is over.
+    Boundaries are computed from start_at so time spent processing never adds drift,
+    and when processing falls behind the missed windows are caught up following `policy`
+    """
+    if policy not in CATCH_UP_POLICIES:
+        raise ValueError(f"Unknown catch up policy {policy}")
+
+    delta = timedelta(seconds=delta_seconds)
+    window = 1  # index of the boundary closing the next window
+    while True:
+        end_at = start_at + window * delta
+        wait = (end_at - now()).total_seconds()
+        if wait > 0:
+            sleep(wait)
+
+        # how many windows are already over beyond the one we were waiting for
+        behind = max(int((now() - end_at) / delta), 0)
+        if behind and logger:
+            logger.warning(f"Integration is {behind} window(s) behind, catching up ({policy})")
+
+        if behind and policy == CATCH_UP_MERGE:
+            window += behind
+            yield start_at + (window - 1 - behind) * delta, start_at + window * delta
+        else:
+            yield end_at - delta, end_at
+        window += 1
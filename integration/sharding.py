@@ -0,0 +1,133 @@
+import logging
+import multiprocessing
+import queue
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from requests import RequestException
+
+from integration.constants import MAX_CONCURRENCY, STREAM_EVENTS
+from integration.events.pipeline import flush_pending, run_events
+from integration.events.utils import warm_up_caches
+from integration.fetcher import fetch_pages
+from integration.metrics import observe_window
+
+WORKER_FORMAT = "%(asctime)s | %(levelname)-5s | shard {shard} | %(message)s"
+
+
+class ShardError(RuntimeError):
+    """Raised when a shard failed to process some of the events of a window"""
+
+
+def shard_for(conversation_id: Any, shards: int) -> int:
+    """Stable shard for a conversation, the same conversation always lands on the same worker"""
+    return zlib.crc32(str(conversation_id).encode()) % shards
+
+
+def partition(events: List, shards: int) -> Dict[int, List]:
+    """
+    Split events by shard keeping their original order inside each shard, events are
+    still raw here so malformed ones go to some shard and are dropped by its validation
+    """
+    batches = defaultdict(list)
+    for event in events:
+        conversation_id = event.get("conversation_id") if isinstance(event, dict) else None
+        batches[shard_for(conversation_id, shards)].append(event)
+    return batches
+
+
+def _worker(
+    shard: int, inbox: multiprocessing.Queue, progress: multiprocessing.Queue, max_concurrency: int, warm_up: bool
+) -> None:
+    """
+    Worker process loop, every worker has its own caches and HTTP pools since
+    processes are spawned and import the integration from scratch
+    """
+    logging.basicConfig(format=WORKER_FORMAT.format(shard=shard), datefmt="%I:%M:%S %p", force=True)
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+    if warm_up:
+        try:
+            warm_up_caches(logger)
+        except RequestException as exception:
+            logger.warning(f"Could not warm up caches: {exception}")
+
+    while (batch := inbox.get()) is not None:
+        try:
+            run_events(batch, logger, max_concurrency)
+            progress.put((shard, len(batch), None))
+        except Exception as exception:
+            logger.exception("Failed to process batch")
+            progress.put((shard, len(batch), repr(exception)))
+    flush_pending(logger, max_concurrency)
+
+
+class ShardedRunner:
+    """
+    Fetch events once and partition them by conversation across worker processes,
+    since a conversation always goes to the same worker its events keep their order
+    """
+
+    def __init__(self, shards: int, logger: Any, max_concurrency: int = MAX_CONCURRENCY, warm_up: bool = True):
+        context = multiprocessing.get_context("spawn")
+        self.logger = logger
+        self.inboxes = [context.Queue() for _ in range(shards)]
+        self.progress = context.Queue()
+        self.processed = [0] * shards  # events processed by every shard since start
+        self.workers = [
+            context.Process(
+                target=_worker,
+                args=(shard, inbox, self.progress, max_concurrency, warm_up),
+                name=f"integration-shard-{shard}",
+                daemon=True,
+            )
+            for shard, inbox in enumerate(self.inboxes)
+        ]
+
+    def __enter__(self) -> "ShardedRunner":
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def _wait(self, pending: int) -> List[str]:
+        errors = []
+        while pending:
+            try:
+                shard, count, error = self.progress.get(timeout=1)
+            except queue.Empty:
+                dead = [worker.name for worker in self.workers if not worker.is_alive()]
+                if dead:
+                    raise ShardError(f"Worker(s) {', '.join(dead)} died")
+                continue
+            pending -= 1
+            self.processed[shard] += count
+            if error:
+                errors.append(f"shard {shard}: {error}")
+        return errors
+
+    def run_window(self, start_at, end_at, stream: bool = STREAM_EVENTS) -> None:
+        """Dispatch the events of a window to the shards and wait until all of them are done"""
+        self.logger.info(f"Retrieving BigChat events from {start_at} to {end_at}")
+        pending, window_counts = 0, [0] * len(self.workers)
+        for events in fetch_pages(start_at, end_at, stream=stream):
+            for shard, batch in partition(events, len(self.workers)).items():
+                self.inboxes[shard].put(batch)
+                window_counts[shard] += len(batch)
+                pending += 1
+
+        errors = self._wait(pending)
+        observe_window(end_at)
+        summary = ", ".join(
+            f"shard {shard}: {count} ({self.processed[shard]} total)" for shard, count in enumerate(window_counts)
+        )
+        self.logger.info(f"Window processed by shards, {summary}")
+        if errors:
+            raise ShardError("; ".join(errors))
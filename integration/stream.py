@@ -0,0 +1,92 @@
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Optional
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class EventStream:
+    """
+    Incremental parser for the body of BigChat's /events, events are yielded
+    one at a time as soon as they are received so the whole body is never in memory.
+    The other keys (like nextPageUrl) are available once the stream is consumed
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.next_page_url: Optional[str] = None
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Read one more chunk into the buffer, False when the body is over"""
+        if self._eof:
+            return False
+        # drop what was already parsed so the buffer only holds the pending data
+        self._buffer = self._buffer[self._position :]
+        self._position = 0
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            self._buffer += self._text.decode(b"", final=True)
+        else:
+            self._buffer += self._text.decode(chunk)
+        return True
+
+    def _peek(self) -> str:
+        """Next non whitespace character without consuming it"""
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in _WHITESPACE:
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                raise ValueError("Unexpected end of BigChat response")
+
+    def _expect(self, *characters: str) -> str:
+        character = self._peek()
+        if character not in characters:
+            raise ValueError(f"Expected one of {characters} but found {character!r} in BigChat response")
+        self._position += 1
+        return character
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number at the very end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._position = end
+            return value
+
+    def __iter__(self) -> Iterator[dict]:
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == "events":
+                self._expect("[")
+                if self._peek() == "]":
+                    self._position += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(",", "]") == "]":
+                            break
+            else:
+                value = self._value()
+                if key == "nextPageUrl":
+                    self.next_page_url = value
+            if self._expect(",", "}") == "}":
+                return
@@ -0,0 +1,148 @@
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterator, Optional
+
+_NO_SPAN = nullcontext()
+
+
+class Tracer:
+    """
+    Records spans in the Chrome trace event format, the file it writes opens in
+    chrome://tracing or https://ui.perfetto.dev with one row per thread.
+    Disabled by default, spans cost a single attribute check until enabled
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._events = []
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter_ns()
+
+    def enable(self) -> None:
+        self._started_at = time.perf_counter_ns()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._events.clear()
+
+    def _now(self) -> float:
+        return (time.perf_counter_ns() - self._started_at) / 1000  # microseconds
+
+    @contextmanager
+    def _span(self, category: str, name: str, args: dict) -> Iterator[None]:
+        started_at = self._now()
+        try:
+            yield
+        finally:
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": started_at,
+                "dur": self._now() - started_at,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = args
+            with self._lock:
+                self._events.append(event)
+
+    def span(self, category: str, name: Optional[str] = None, **args):
+        """Context manager timing a block, category is the stage (fetch, parse, resolve, write...)"""
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(category, name or category, args)
+
+    def traced(self, category: str) -> Callable:
+        """Decorator recording a span named after the function on every call"""
+
+        def decorator(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self._span(category, function.__name__, {}):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def events(self) -> list:
+        with self._lock:
+            events = list(self._events)
+        # name the rows after the threads still alive
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for tid in {event["tid"] for event in events} & names.keys():
+            events.append(
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": names[tid]}}
+            )
+        return events
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, file)
+
+
+class Profiler:
+    """
+    cProfile only follows the thread that enabled it, so every thread running
+    work through `run` gets its own profile and they are merged when dumped
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._profiles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def _profile(self) -> cProfile.Profile:
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def run(self, function: Callable, *args, **kwargs) -> Any:
+        # calls nested inside a profiled one are already being profiled
+        if not self.enabled or getattr(self._local, "running", False):
+            return function(*args, **kwargs)
+        self._local.running = True
+        try:
+            return self._profile().runcall(function, *args, **kwargs)
+        finally:
+            self._local.running = False
+
+    def stats(self) -> Optional[pstats.Stats]:
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        return pstats.Stats(*profiles)
+
+    def dump(self, path: str) -> None:
+        stats = self.stats()
+        if stats is not None:
+            stats.dump_stats(path)
+
+
+tracer = Tracer()
+profiler = Profiler()
@@ -0,0 +1,65 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Set
+from uuid import UUID
+
+AGENT_CACHE_SIZE = int(os.environ.get("OUR_API_AGENT_CACHE_SIZE", 10_000))
+
+
+class AgentCache:
+    """
+    Agents known to exist, so the routes that write can validate them without a query.
+
+    Agents are never deleted so a known agent can't go stale, only the least recently used
+    ones are dropped once there are more than max_size.
+    """
+
+    def __init__(self, max_size: int = AGENT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._agent_ids = OrderedDict()
+        # shared by the threadpool workers of the sync app
+        self._lock = threading.Lock()
+
+    def add(self, agent_id: UUID) -> None:
+        with self._lock:
+            self._agent_ids[agent_id] = None
+            self._agent_ids.move_to_end(agent_id)
+            while len(self._agent_ids) > self.max_size:
+                self._agent_ids.popitem(last=False)
+
+    def unknown(self, agent_ids: Iterable[Optional[UUID]]) -> Set[UUID]:
+        """
+        Which of the given agents still have to be looked up, counting the hits and misses.
+        """
+        unknown = set()
+        with self._lock:
+            for agent_id in agent_ids:
+                if not agent_id:
+                    continue
+                if agent_id in self._agent_ids:
+                    self._agent_ids.move_to_end(agent_id)
+                    self.hits += 1
+                else:
+                    unknown.add(agent_id)
+                    self.misses += 1
+        return unknown
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._agent_ids.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._agent_ids)
+
+
+agent_cache = AgentCache()
@@ -0,0 +1,420 @@
+"""
+OurAPI served with async routes over an async SQLAlchemy engine, so many requests
+can be in flight on a single event loop instead of one per threadpool worker.
+Same routes and payloads as main.py, both are built on handlers.py:
+
+    cd our_api && uvicorn async_main:app --port 8266
+"""
+
+import logging
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime
+from http import HTTPStatus
+from typing import Annotated, AsyncIterator, Iterable, List, Optional, Set
+from uuid import UUID
+
+import uvicorn
+from fastapi import Depends, FastAPI, Query, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database
+import handlers
+import schemas
+from agent_cache import agent_cache
+from database.async_base import AsyncSessionLocal, AsyncWriteSessionLocal, init_async_db
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate_async
+from queries import (
+    agents_by_query,
+    agents_query,
+    chat_ids_query,
+    chats_by_id_query,
+    chats_query,
+    messages_query,
+    taken_external_ids_query,
+    upsert_chat_query,
+)
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """
+    Get an async database session.
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+async def get_write_session() -> AsyncIterator[AsyncSession]:
+    """
+    Get an async database session for a route that writes.
+    """
+    async with AsyncWriteSessionLocal() as session:
+        yield session
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the schema once at startup instead of on every request, report the agent cache at shutdown.
+    """
+    await init_async_db()
+    yield
+    logger.info(f"Agent cache hit rate {agent_cache.hit_rate:.1%} ({agent_cache.hits} hits)")
+
+
+app = FastAPI(title="Fake API", version="1.0.0", lifespan=lifespan)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stream_handler = logging.StreamHandler(sys.stdout)
+log_formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+stream_handler.setFormatter(log_formatter)
+logger.addHandler(stream_handler)
+logger.info("Async API is starting up")
+
+
+async def _existing_agents(session: AsyncSession, agent_ids: Iterable[Optional[UUID]]) -> Set[UUID]:
+    """
+    Which of the given agents exist, the ones that aren't cached are looked up in a single query.
+    """
+    agent_ids, unknown = handlers.agents_to_look_up(agent_ids)
+    found = set(await session.scalars(agents_query(unknown))) if unknown else set()
+    return handlers.existing_agents(agent_ids, unknown, found)
+
+
+async def _check_agent(session: AsyncSession, agent_id: Optional[UUID]) -> None:
+    handlers.check_agent(agent_id, await _existing_agents(session, [agent_id]))
+
+
+async def _commit(session: AsyncSession, conflict: str):
+    """
+    Commit, rolling back and answering a 409 when it breaks a unique constraint.
+    """
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise handlers.conflict(conflict)
+
+
+@app.post(
+    "/chats",
+    response_model=schemas.Chat,
+    status_code=HTTPStatus.CREATED,
+    summary="Create a chat",
+    tags=["Chats"],
+)
+async def post_chat(
+    data: schemas.ChatCreate,
+    response: Response,
+    session: AsyncSession = Depends(get_write_session),
+):
+    """
+    Create a chat.
+    """
+
+    logging.info("Creating a chat")
+
+    # Ensure the agent exists.
+    await _check_agent(session, data.agent_id)
+
+    chat = handlers.new_chat(data)
+    session.add(chat)
+    await _commit(session, handlers.EXTERNAL_ID_TAKEN)
+
+    handlers.created(response, f"/chats/{chat.chat_id}")
+    return chat
+
+
+@app.patch(
+    "/chats/{chat_id}",
+    status_code=HTTPStatus.NO_CONTENT,
+    summary="Edit a chat",
+    tags=["Chats"],
+)
+async def patch_chat(chat_id: UUID, data: schemas.ChatUpdate, session: AsyncSession = Depends(get_write_session)):
+    """
+    Edit a chat.
+    """
+    chat = handlers.found(await session.get(database.Chat, chat_id))
+
+    # Ensure the agent exists.
+    await _check_agent(session, data.agent_id)
+
+    handlers.edit_chat(chat, data)
+    await session.commit()
+
+    return {}
+
+
+@app.post(
+    "/chats/{chat_id}/messages",
+    response_model=schemas.Chat,
+    summary="Create a message",
+    tags=["Messages"],
+)
+async def post_chat_message(
+    chat_id: UUID, data: schemas.MessageCreate, session: AsyncSession = Depends(get_write_session)
+):
+    """
+    Create a chat message.
+    """
+    chat = handlers.found(await session.get(database.Chat, chat_id))
+
+    # Ensure the agent exists.
+    await _check_agent(session, data.agent_id)
+
+    session.add(handlers.new_message(data, chat_id))
+    await session.commit()
+
+    return chat
+
+
+@app.put(
+    "/chats/external/{external_id}",
+    response_model=schemas.Chat,
+    summary="Create or edit a chat by external ID",
+    tags=["Chats"],
+)
+async def put_chat_by_external_id(
+    external_id: str,
+    data: schemas.ChatUpsert,
+    response: Response,
+    session: AsyncSession = Depends(get_write_session),
+):
+    """
+    Create the chat with that external ID, or edit it when it already exists, so it can be retried.
+    """
+    await _check_agent(session, data.agent_id)
+
+    values, update = handlers.upsert_values(external_id, data)
+    query = upsert_chat_query(session.get_bind().dialect.name, values, update)
+    chat = (await session.scalars(query, execution_options={"populate_existing": True})).one()
+    await session.commit()
+
+    if chat.chat_id == values["chat_id"]:
+        handlers.created(response, f"/chats/{chat.chat_id}")
+    return chat
+
+
+@app.patch(
+    "/chats/external/{external_id}",
+    status_code=HTTPStatus.NO_CONTENT,
+    summary="Edit a chat by external ID",
+    tags=["Chats"],
+)
+async def patch_chat_by_external_id(
+    external_id: str, data: schemas.ChatUpdate, session: AsyncSession = Depends(get_write_session)
+):
+    """
+    Edit a chat, found by its external ID instead of looking its ID up first.
+    """
+    chat = handlers.found(await session.scalar(chats_query(external_id=external_id)))
+    await _check_agent(session, data.agent_id)
+
+    handlers.edit_chat(chat, data)
+    await session.commit()
+
+    return {}
+
+
+@app.post(
+    "/chats/external/{external_id}/messages",
+    response_model=schemas.Chat,
+    summary="Create a message by the chat's external ID",
+    tags=["Messages"],
+)
+async def post_chat_message_by_external_id(
+    external_id: str, data: schemas.MessageCreate, session: AsyncSession = Depends(get_write_session)
+):
+    """
+    Create a message for a chat found by its external ID instead of looking its ID up first.
+    """
+    chat = handlers.found(await session.scalar(chats_query(external_id=external_id)))
+    await _check_agent(session, data.agent_id)
+
+    session.add(handlers.new_message(data, chat.chat_id))
+    await session.commit()
+
+    return chat
+
+
+@app.post(
+    "/batch/chats",
+    response_model=List[schemas.BatchResult],
+    summary="Create several chats",
+    tags=["Batch"],
+)
+async def post_chats_batch(data: List[schemas.ChatCreate], session: AsyncSession = Depends(get_write_session)):
+    """
+    Create several chats in a single transaction, every item gets its own result.
+    """
+    logging.info(f"Creating {len(data)} chats")
+
+    agents = await _existing_agents(session, {item.agent_id for item in data})
+    taken = set(await session.scalars(taken_external_ids_query({item.external_id for item in data})))
+
+    chats, results = handlers.chats_batch(data, agents, taken)
+    session.add_all(chats)
+    await _commit(session, handlers.BATCH_CONFLICT)
+    return results
+
+
+@app.patch(
+    "/batch/chats",
+    response_model=List[schemas.BatchResult],
+    summary="Edit several chats",
+    tags=["Batch"],
+)
+async def patch_chats_batch(data: List[schemas.ChatBatchUpdate], session: AsyncSession = Depends(get_write_session)):
+    """
+    Edit several chats in a single transaction, every item gets its own result.
+    """
+    agents = await _existing_agents(session, {item.agent_id for item in data})
+    chats = await session.scalars(chats_by_id_query({item.chat_id for item in data}))
+
+    results = handlers.edit_chats_batch(data, agents, {chat.chat_id: chat for chat in chats})
+    await _commit(session, handlers.BATCH_CONFLICT)
+    return results
+
+
+@app.post(
+    "/batch/messages",
+    response_model=List[schemas.BatchResult],
+    summary="Create several messages",
+    tags=["Batch"],
+)
+async def post_messages_batch(data: List[schemas.MessageCreate], session: AsyncSession = Depends(get_write_session)):
+    """
+    Create messages for one or more chats in a single transaction, every item gets its own result.
+    """
+    agents = await _existing_agents(session, {item.agent_id for item in data})
+    chat_ids = set(await session.scalars(chat_ids_query({item.chat_id for item in data if item.chat_id})))
+
+    messages, results = handlers.messages_batch(data, agents, chat_ids)
+    session.add_all(messages)
+    await _commit(session, handlers.BATCH_CONFLICT)
+    return results
+
+
+@app.get(
+    "/chats/{chat_id}/messages",
+    response_model=List[schemas.Message],
+    summary="Get a chat's messages",
+    tags=["Messages"],
+)
+async def get_chat_messages(
+    chat_id: UUID,
+    response: Response,
+    cursor: Annotated[Optional[str], Query(description="X-Next-Cursor header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="Page size.", ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Get a chat's messages, a page at a time in the order they were sent.
+    """
+    handlers.found(await session.get(database.Chat, chat_id))
+
+    query = messages_query(chat_id)
+    return await paginate_async(
+        session, query, database.Message.sent_at, database.Message.message_id, cursor, limit, response
+    )
+
+
+@app.get(
+    "/chats/{chat_id}",
+    response_model=schemas.Chat,
+    summary="Get a chat",
+    tags=["Chats"],
+)
+async def get_chat(chat_id: UUID, session: AsyncSession = Depends(get_session)):
+    """
+    Get a chat.
+    """
+    return handlers.found(await session.get(database.Chat, chat_id))
+
+
+@app.get(
+    "/chats",
+    response_model=List[schemas.Chat],
+    summary="Get several chats",
+    tags=["Chats"],
+)
+async def get_chats(
+    response: Response,
+    external_id: Annotated[
+        Optional[str],
+        Query(description="Optionally filter to find chats with a given external ID."),
+    ] = None,
+    agent_id: Annotated[Optional[UUID], Query(description="Optionally filter to find an agent's chats.")] = None,
+    started_after: Annotated[Optional[datetime], Query(description="Chats started at or after.")] = None,
+    started_before: Annotated[Optional[datetime], Query(description="Chats started before.")] = None,
+    ended_after: Annotated[Optional[datetime], Query(description="Chats ended at or after.")] = None,
+    ended_before: Annotated[Optional[datetime], Query(description="Chats ended before.")] = None,
+    open_only: Annotated[bool, Query(description="Only chats that haven't ended.")] = False,
+    cursor: Annotated[Optional[str], Query(description="X-Next-Cursor header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="Page size.", ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Get chats, a page at a time in the order they started.
+    """
+    query = chats_query(external_id, agent_id, started_after, started_before, ended_after, ended_before, open_only)
+    return await paginate_async(
+        session, query, database.Chat.started_at, database.Chat.chat_id, cursor, limit, response
+    )
+
+
+@app.post(
+    "/agents",
+    response_model=schemas.Agent,
+    status_code=HTTPStatus.CREATED,
+    summary="Create an agent",
+    tags=["Agents"],
+)
+async def post_agent(
+    data: schemas.AgentCreate,
+    response: Response,
+    session: AsyncSession = Depends(get_write_session),
+):
+    """
+    Create an agent.
+    """
+    agent = handlers.new_agent(data)
+    session.add(agent)
+    await session.commit()
+    agent_cache.add(agent.agent_id)
+
+    handlers.created(response, f"/agents/{agent.agent_id}")
+    return agent
+
+
+@app.get("/agents/{agent_id}", response_model=schemas.Agent, summary="Get an agent", tags=["Agents"])
+async def get_agent(agent_id: UUID, session: AsyncSession = Depends(get_session)):
+    """
+    Get an agent.
+    """
+    return handlers.found(await session.get(database.Agent, agent_id), handlers.AGENT_NOT_FOUND)
+
+
+@app.get("/agents", response_model=List[schemas.Agent], summary="Get agents", tags=["Agents"])
+async def get_agents(
+    name: Annotated[
+        Optional[str],
+        Query(description="Optionally filter to find agents with a given name"),
+    ] = None,
+    email: Annotated[
+        Optional[str],
+        Query(description="Optionally filter to find agents with a given email address"),
+    ] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Get agents.
+    """
+    return (await session.scalars(agents_by_query(name, email))).all()
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8266)
@@ -1,4 +1,4 @@
-from .base import SessionLocal, engine
+from .base import SessionLocal, WriteSessionLocal, engine, init_db
 from .base import Base
 from .agent import Agent
 from .chat import Chat
@@ -0,0 +1,49 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .base import DATABASE_POOL_SIZE, SQLALCHEMY_DATABASE_URL, Base, _configure_sqlite, _single_writer
+
+# same database as the sync engine through the async driver of its backend
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def _create_async_engine(url: str, pool_size: int = DATABASE_POOL_SIZE):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    url = url.set(drivername=ASYNC_DRIVERS.get(backend, url.drivername))
+    if backend != "sqlite":
+        return create_async_engine(url, pool_size=pool_size, pool_pre_ping=True)
+
+    # an in-memory database only lives in its connection, see base._create_engine
+    in_memory = url.database in (None, "", ":memory:")
+    engine = create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1 if in_memory else pool_size,
+        max_overflow=0 if in_memory or pool_size == 1 else 10,
+    )
+    _configure_sqlite(engine.sync_engine)
+    return engine
+
+
+async_engine = _create_async_engine(SQLALCHEMY_DATABASE_URL)
+# see base._single_writer
+async_write_engine = (
+    _create_async_engine(SQLALCHEMY_DATABASE_URL, pool_size=1)
+    if _single_writer(SQLALCHEMY_DATABASE_URL)
+    else async_engine
+)
+# objects stay usable after commit since lazy loads are not possible in async code
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncWriteSessionLocal = async_sessionmaker(
+    async_write_engine.execution_options(begin_immediate=True), autoflush=False, expire_on_commit=False
+)
+
+
+async def init_async_db():
+    """
+    Create the tables that don't exist yet, once when the API starts.
+    """
+    async with async_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
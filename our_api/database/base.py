@@ -1,10 +1,100 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+# e.g. sqlite:///our_api.db to keep the data between restarts
+SQLALCHEMY_DATABASE_URL = os.environ.get("OUR_API_DATABASE_URL", "sqlite:///:memory:")
+DATABASE_POOL_SIZE = int(os.environ.get("OUR_API_DATABASE_POOL_SIZE", 10))
+
+# applied to every new SQLite connection, WAL lets reads go on while a write is in progress
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # durable with WAL, without a sync on every commit
+    "busy_timeout": 5000,  # milliseconds a writer waits for another one instead of failing
+    "cache_size": -64000,  # KiB
+    "temp_store": "MEMORY",
+}
+
+
+def _single_writer(url: str) -> bool:
+    """
+    Whether writes to the database go through their own connection, one at a time.
+
+    SQLite only has one writer, so the routes that write queue in turn for the connection of
+    their engine instead of retrying on the database lock, where some of them can wait past the
+    busy timeout. An in-memory database already only has one connection.
+    """
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def _create_engine(url: str, pool_size: int = DATABASE_POOL_SIZE):
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(url, pool_size=pool_size, pool_pre_ping=True)
+
+    if url.database in (None, "", ":memory:"):
+        # an in-memory database only lives in its connection, so a single one is shared
+        # and handed to one session at a time
+        engine = create_engine(
+            url, connect_args={"check_same_thread": False}, poolclass=QueuePool, pool_size=1, max_overflow=0
+        )
+    else:
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=QueuePool,
+            pool_size=pool_size,
+            max_overflow=0 if pool_size == 1 else 10,
+        )
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+    _configure_sqlite(engine)
+    return engine
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+def _configure_sqlite(engine):
+    """
+    Pragmas on every new connection, and write transactions that take the lock when they begin.
+
+    A deferred BEGIN only asks for the lock at the first write, and a read then write transaction
+    (e.g. checking the agent before inserting the chat) fails with "database is locked" right away,
+    instead of waiting the busy timeout, when another process committed in between. Reads stay
+    deferred so they don't queue behind the writers.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(connection, _):
+        connection.isolation_level = None  # the transactions are begun below
+        cursor = connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(connection):
+        immediate = connection.get_execution_options().get("begin_immediate")
+        connection.exec_driver_sql("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+write_engine = (
+    _create_engine(SQLALCHEMY_DATABASE_URL, pool_size=1) if _single_writer(SQLALCHEMY_DATABASE_URL) else engine
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# for the routes that write
+WriteSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=write_engine.execution_options(begin_immediate=True)
+)
 
 Base = declarative_base()
+
+
+def init_db():
+    """
+    Create the tables that don't exist yet, once when the API starts.
+    """
+    Base.metadata.create_all(bind=engine)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, UUID, TIMESTAMP, Text, ForeignKey
+from sqlalchemy import Column, UUID, TIMESTAMP, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from .base import Base
@@ -12,3 +12,9 @@ class Chat(Base):
     ended_at = Column(TIMESTAMP)
     external_id = Column(Text, nullable=False, unique=True)
     messages = relationship("Message")
+
+    __table_args__ = (
+        # keyset pagination goes through (started_at, chat_id)
+        Index("ix_chats_started_at_chat_id", "started_at", "chat_id"),
+        Index("ix_chats_agent_id", "agent_id"),
+    )
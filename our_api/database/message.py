@@ -1,4 +1,4 @@
-from sqlalchemy import Column, UUID, TIMESTAMP, Text, ForeignKey
+from sqlalchemy import Column, UUID, TIMESTAMP, Text, ForeignKey, Index
 
 from .base import Base
 
@@ -10,3 +10,8 @@ class Message(Base):
     agent_id = Column(UUID, ForeignKey("agents.agent_id"))
     sent_at = Column(TIMESTAMP, nullable=False)
     text = Column(Text, nullable=False)
+
+    __table_args__ = (
+        # a chat's messages are listed in (sent_at, message_id) order
+        Index("ix_messages_chat_id_sent_at", "chat_id", "sent_at", "message_id"),
+    )
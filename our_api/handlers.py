@@ -0,0 +1,158 @@
+"""
+What the routes of main.py and async_main.py share: validation, rows built from the
+payloads and the results of batch items, so both apps only differ in their database calls.
+"""
+
+from http import HTTPStatus
+from typing import Iterable, List, Optional, Set, Tuple
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException, Response
+
+import database
+import schemas
+from agent_cache import agent_cache
+
+AGENT_NOT_FOUND = "Agent not found"
+CHAT_NOT_FOUND = "Chat not found"
+UNKNOWN_AGENT = "That agent does not exist."
+EXTERNAL_ID_TAKEN = "A chat with that external ID already exists."
+BATCH_CONFLICT = "The batch conflicts with concurrent changes, nothing was written."
+
+
+def found(row, detail: str = CHAT_NOT_FOUND):
+    """
+    The row, or a 404 when there is none.
+    """
+    if row is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=detail)
+    return row
+
+
+def check_agent(agent_id: Optional[UUID], existing_agents: Set[UUID]) -> None:
+    if agent_id and agent_id not in existing_agents:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=UNKNOWN_AGENT)
+
+
+def conflict(detail: str) -> HTTPException:
+    return HTTPException(status_code=HTTPStatus.CONFLICT, detail=detail)
+
+
+def agents_to_look_up(agent_ids: Iterable[Optional[UUID]]) -> Tuple[Set[UUID], Set[UUID]]:
+    """
+    The given agents without the empty ones, and which of them aren't cached.
+    """
+    agent_ids = {agent_id for agent_id in agent_ids if agent_id}
+    return agent_ids, agent_cache.unknown(agent_ids)
+
+
+def existing_agents(agent_ids: Set[UUID], unknown: Set[UUID], found_agents: Set[UUID]) -> Set[UUID]:
+    """
+    The given agents that exist, caching the ones the database found.
+    """
+    for agent_id in found_agents:
+        agent_cache.add(agent_id)
+    return (agent_ids - unknown) | found_agents
+
+
+def created(response: Response, location: str) -> None:
+    response.status_code = HTTPStatus.CREATED
+    response.headers["Location"] = location
+
+
+def new_agent(data: schemas.AgentCreate) -> database.Agent:
+    return database.Agent(agent_id=uuid4(), name=data.name, email=data.email)
+
+
+def new_chat(data: schemas.ChatCreate) -> database.Chat:
+    return database.Chat(
+        agent_id=data.agent_id,
+        chat_id=uuid4(),
+        started_at=data.started_at,
+        ended_at=data.ended_at,
+        external_id=data.external_id,
+    )
+
+
+def new_message(data: schemas.MessageCreate, chat_id: UUID) -> database.Message:
+    return database.Message(
+        message_id=uuid4(),
+        agent_id=data.agent_id,
+        chat_id=chat_id,
+        sent_at=data.sent_at,
+        text=data.text,
+    )
+
+
+def edit_chat(chat: database.Chat, data: schemas.ChatUpdate) -> None:
+    for field in data.dict(exclude_unset=True, exclude={"chat_id"}):
+        setattr(chat, field, getattr(data, field))
+
+
+def upsert_values(external_id: str, data: schemas.ChatUpsert) -> Tuple[dict, dict]:
+    """
+    Columns of the chat to insert, and the ones to edit when it already exists.
+    """
+    return {**data.dict(), "chat_id": uuid4(), "external_id": external_id}, data.dict(exclude_unset=True)
+
+
+def chats_batch(
+    data: List[schemas.ChatCreate], agents: Set[UUID], taken: Set[str]
+) -> Tuple[List[database.Chat], List[schemas.BatchResult]]:
+    """
+    Chats to create and the result of every item.
+    """
+    chats, results = [], []
+    for item in data:
+        if item.agent_id and item.agent_id not in agents:
+            results.append(schemas.BatchResult(status=HTTPStatus.BAD_REQUEST, detail=UNKNOWN_AGENT))
+            continue
+        if item.external_id in taken:
+            results.append(schemas.BatchResult(status=HTTPStatus.CONFLICT, detail=EXTERNAL_ID_TAKEN))
+            continue
+
+        taken.add(item.external_id)
+        chat = new_chat(item)
+        chats.append(chat)
+        results.append(schemas.BatchResult(status=HTTPStatus.CREATED, id=chat.chat_id))
+    return chats, results
+
+
+def edit_chats_batch(data: List[schemas.ChatBatchUpdate], agents: Set[UUID], chats: dict) -> List[schemas.BatchResult]:
+    """
+    Edit the chats found by ID and return the result of every item.
+    """
+    results = []
+    for item in data:
+        chat = chats.get(item.chat_id)
+        if not chat:
+            results.append(schemas.BatchResult(status=HTTPStatus.NOT_FOUND, detail=CHAT_NOT_FOUND))
+            continue
+        if item.agent_id and item.agent_id not in agents:
+            results.append(schemas.BatchResult(status=HTTPStatus.BAD_REQUEST, detail=UNKNOWN_AGENT))
+            continue
+
+        edit_chat(chat, item)
+        results.append(schemas.BatchResult(status=HTTPStatus.NO_CONTENT, id=chat.chat_id))
+    return results
+
+
+def messages_batch(
+    data: List[schemas.MessageCreate], agents: Set[UUID], chat_ids: Set[UUID]
+) -> Tuple[List[database.Message], List[schemas.BatchResult]]:
+    """
+    Messages to create and the result of every item.
+    """
+    messages, results = [], []
+    for item in data:
+        if item.chat_id not in chat_ids:
+            results.append(schemas.BatchResult(status=HTTPStatus.NOT_FOUND, detail=CHAT_NOT_FOUND))
+            continue
+        if item.agent_id and item.agent_id not in agents:
+            results.append(schemas.BatchResult(status=HTTPStatus.BAD_REQUEST, detail=UNKNOWN_AGENT))
+            continue
+
+        message = new_message(item, item.chat_id)
+        messages.append(message)
+        results.append(schemas.BatchResult(status=HTTPStatus.CREATED, id=message.message_id))
+    return messages, results
@@ -1,29 +1,42 @@
 import logging
 import sys
+from contextlib import asynccontextmanager
 from http import HTTPStatus
-from typing import Optional, Annotated, List
+from typing import Optional, Annotated, Iterable, List, Set
 
-from sqlalchemy import select, exists
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+import handlers
 import schemas
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from queries import (
+    agents_by_query,
+    agents_query,
+    chat_ids_query,
+    chats_by_id_query,
+    chats_query,
+    messages_query,
+    taken_external_ids_query,
+    upsert_chat_query,
+)
 
-from uuid import uuid4, UUID
+from datetime import datetime
+from uuid import UUID
 
-from database import Base, SessionLocal, engine
+from database import SessionLocal, WriteSessionLocal, init_db
 import database
+from agent_cache import agent_cache
 
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, Response, Depends, Query
+from fastapi import FastAPI, Response, Depends, Query
 
 
 def get_session() -> Session:
     """
     Get a database session.
     """
-    Base.metadata.create_all(bind=engine)
     session = SessionLocal()
     try:
         yield session
@@ -31,7 +44,28 @@ def get_session() -> Session:
         session.close()
 
 
-app = FastAPI(title="Fake API", version="1.0.0")
+def get_write_session() -> Session:
+    """
+    Get a database session for a route that writes.
+    """
+    session = WriteSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the schema once at startup instead of on every request, report the agent cache at shutdown.
+    """
+    init_db()
+    yield
+    logger.info(f"Agent cache hit rate {agent_cache.hit_rate:.1%} ({agent_cache.hits} hits)")
+
+
+app = FastAPI(title="Fake API", version="1.0.0", lifespan=lifespan)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -42,6 +76,30 @@ logger.addHandler(stream_handler)
 logger.info("API is starting up")
 
 
+def _existing_agents(session: Session, agent_ids: Iterable[Optional[UUID]]) -> Set[UUID]:
+    """
+    Which of the given agents exist, the ones that aren't cached are looked up in a single query.
+    """
+    agent_ids, unknown = handlers.agents_to_look_up(agent_ids)
+    found = set(session.scalars(agents_query(unknown))) if unknown else set()
+    return handlers.existing_agents(agent_ids, unknown, found)
+
+
+def _check_agent(session: Session, agent_id: Optional[UUID]) -> None:
+    handlers.check_agent(agent_id, _existing_agents(session, [agent_id]))
+
+
+def _commit(session: Session, conflict: str):
+    """
+    Commit, rolling back and answering a 409 when it breaks a unique constraint.
+    """
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise handlers.conflict(conflict)
+
+
 @app.post(
     "/chats",
     response_model=schemas.Chat,
@@ -52,7 +110,7 @@ logger.info("API is starting up")
 def post_chat(
     data: schemas.ChatCreate,
     response: Response,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_write_session),
 ):
     """
     Create a chat.
@@ -61,30 +119,14 @@ def post_chat(
     logging.info("Creating a chat")
 
     # Ensure the agent exists.
-    if data.agent_id and not session.scalar(select(exists().where(database.Agent.agent_id == data.agent_id))):
-        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="That agent does not exist.")
-
-    chat_id = uuid4()
-    chat = database.Chat(
-        agent_id=data.agent_id,
-        chat_id=chat_id,
-        started_at=data.started_at,
-        ended_at=data.ended_at,
-        external_id=data.external_id,
-    )
+    _check_agent(session, data.agent_id)
 
+    chat = handlers.new_chat(data)
     session.add(chat)
-
-    try:
-        session.commit()
-    except IntegrityError:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND,
-            detail="A chat with that external ID already exists.",
-        )
+    _commit(session, handlers.EXTERNAL_ID_TAKEN)
 
     session.refresh(chat)
-    response.headers["Location"] = f"/chats/{chat_id}"
+    handlers.created(response, f"/chats/{chat.chat_id}")
     return chat
 
 
@@ -94,70 +136,192 @@ def post_chat(
     summary="Edit a chat",
     tags=["Chats"],
 )
-def patch_chat(chat_id: UUID, data: schemas.ChatUpdate, session: Session = Depends(get_session)):
+def patch_chat(chat_id: UUID, data: schemas.ChatUpdate, session: Session = Depends(get_write_session)):
     """
     Edit a chat.
     """
-    chat = session.get(database.Chat, chat_id)
-    if not chat:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Chat not found")
+    chat = handlers.found(session.get(database.Chat, chat_id))
 
     # Ensure the agent exists.
-    if data.agent_id and not session.scalar(select(exists().where(database.Agent.agent_id == data.agent_id))):
-        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="That agent does not exist.")
-
-    for field in data.dict(exclude_unset=True):
-        setattr(chat, field, getattr(data, field))
+    _check_agent(session, data.agent_id)
 
+    handlers.edit_chat(chat, data)
     session.commit()
 
     return {}
 
 
-@app.post("/chats/{chat_id}/messages", summary="Create a message", tags=["Messages"])
-def post_chat_message(chat_id: UUID, data: schemas.MessageCreate, session: Session = Depends(get_session)):
+@app.post(
+    "/chats/{chat_id}/messages",
+    response_model=schemas.Chat,
+    summary="Create a message",
+    tags=["Messages"],
+)
+def post_chat_message(chat_id: UUID, data: schemas.MessageCreate, session: Session = Depends(get_write_session)):
     """
     Create a chat message.
     """
-    chat = session.get(database.Chat, chat_id)
-    if not chat:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Chat not found")
+    chat = handlers.found(session.get(database.Chat, chat_id))
 
     # Ensure the agent exists.
-    if data.agent_id and not session.scalar(select(exists().where(database.Agent.agent_id == data.agent_id))):
-        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="That agent does not exist.")
-
-    message_id = uuid4()
-    message = database.Message(
-        message_id=message_id,
-        agent_id=data.agent_id,
-        chat_id=chat_id,
-        sent_at=data.sent_at,
-        text=data.text,
-    )
-
-    session.add(message)
+    _check_agent(session, data.agent_id)
+
+    session.add(handlers.new_message(data, chat_id))
+    session.commit()
+    session.refresh(chat)
+
+    return chat
+
+
+@app.put(
+    "/chats/external/{external_id}",
+    response_model=schemas.Chat,
+    summary="Create or edit a chat by external ID",
+    tags=["Chats"],
+)
+def put_chat_by_external_id(
+    external_id: str,
+    data: schemas.ChatUpsert,
+    response: Response,
+    session: Session = Depends(get_write_session),
+):
+    """
+    Create the chat with that external ID, or edit it when it already exists, so it can be retried.
+    """
+    _check_agent(session, data.agent_id)
+
+    values, update = handlers.upsert_values(external_id, data)
+    query = upsert_chat_query(session.get_bind().dialect.name, values, update)
+    chat = session.scalars(query, execution_options={"populate_existing": True}).one()
+    session.commit()
+    session.refresh(chat)
+
+    if chat.chat_id == values["chat_id"]:
+        handlers.created(response, f"/chats/{chat.chat_id}")
+    return chat
+
+
+@app.patch(
+    "/chats/external/{external_id}",
+    status_code=HTTPStatus.NO_CONTENT,
+    summary="Edit a chat by external ID",
+    tags=["Chats"],
+)
+def patch_chat_by_external_id(
+    external_id: str, data: schemas.ChatUpdate, session: Session = Depends(get_write_session)
+):
+    """
+    Edit a chat, found by its external ID instead of looking its ID up first.
+    """
+    chat = handlers.found(session.scalar(chats_query(external_id=external_id)))
+    _check_agent(session, data.agent_id)
+
+    handlers.edit_chat(chat, data)
     session.commit()
-    session.refresh(message)
+
+    return {}
+
+
+@app.post(
+    "/chats/external/{external_id}/messages",
+    response_model=schemas.Chat,
+    summary="Create a message by the chat's external ID",
+    tags=["Messages"],
+)
+def post_chat_message_by_external_id(
+    external_id: str, data: schemas.MessageCreate, session: Session = Depends(get_write_session)
+):
+    """
+    Create a message for a chat found by its external ID instead of looking its ID up first.
+    """
+    chat = handlers.found(session.scalar(chats_query(external_id=external_id)))
+    _check_agent(session, data.agent_id)
+
+    session.add(handlers.new_message(data, chat.chat_id))
+    session.commit()
+    session.refresh(chat)
 
     return chat
 
 
+@app.post(
+    "/batch/chats",
+    response_model=List[schemas.BatchResult],
+    summary="Create several chats",
+    tags=["Batch"],
+)
+def post_chats_batch(data: List[schemas.ChatCreate], session: Session = Depends(get_write_session)):
+    """
+    Create several chats in a single transaction, every item gets its own result.
+    """
+    logging.info(f"Creating {len(data)} chats")
+
+    agents = _existing_agents(session, {item.agent_id for item in data})
+    taken = set(session.scalars(taken_external_ids_query({item.external_id for item in data})))
+
+    chats, results = handlers.chats_batch(data, agents, taken)
+    session.add_all(chats)
+    _commit(session, handlers.BATCH_CONFLICT)
+    return results
+
+
+@app.patch(
+    "/batch/chats",
+    response_model=List[schemas.BatchResult],
+    summary="Edit several chats",
+    tags=["Batch"],
+)
+def patch_chats_batch(data: List[schemas.ChatBatchUpdate], session: Session = Depends(get_write_session)):
+    """
+    Edit several chats in a single transaction, every item gets its own result.
+    """
+    agents = _existing_agents(session, {item.agent_id for item in data})
+    chats = session.scalars(chats_by_id_query({item.chat_id for item in data}))
+
+    results = handlers.edit_chats_batch(data, agents, {chat.chat_id: chat for chat in chats})
+    _commit(session, handlers.BATCH_CONFLICT)
+    return results
+
+
+@app.post(
+    "/batch/messages",
+    response_model=List[schemas.BatchResult],
+    summary="Create several messages",
+    tags=["Batch"],
+)
+def post_messages_batch(data: List[schemas.MessageCreate], session: Session = Depends(get_write_session)):
+    """
+    Create messages for one or more chats in a single transaction, every item gets its own result.
+    """
+    agents = _existing_agents(session, {item.agent_id for item in data})
+    chat_ids = set(session.scalars(chat_ids_query({item.chat_id for item in data if item.chat_id})))
+
+    messages, results = handlers.messages_batch(data, agents, chat_ids)
+    session.add_all(messages)
+    _commit(session, handlers.BATCH_CONFLICT)
+    return results
+
+
 @app.get(
     "/chats/{chat_id}/messages",
     response_model=List[schemas.Message],
     summary="Get a chat's messages",
     tags=["Messages"],
 )
-def get_chat_messages(chat_id: UUID, session: Session = Depends(get_session)):
+def get_chat_messages(
+    chat_id: UUID,
+    response: Response,
+    cursor: Annotated[Optional[str], Query(description="X-Next-Cursor header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="Page size.", ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    session: Session = Depends(get_session),
+):
     """
-    Get a chat's messages.
+    Get a chat's messages, a page at a time in the order they were sent.
     """
-    chat = session.get(database.Chat, chat_id)
-    if not chat:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Chat not found")
+    handlers.found(session.get(database.Chat, chat_id))
 
-    return chat.messages
+    query = messages_query(chat_id)
+    return paginate(session, query, database.Message.sent_at, database.Message.message_id, cursor, limit, response)
 
 
 @app.get(
@@ -170,11 +334,7 @@ def get_chat(chat_id: UUID, session: Session = Depends(get_session)):
     """
     Get a chat.
     """
-    chat = session.get(database.Chat, chat_id)
-    if not chat:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Chat not found")
-
-    return chat
+    return handlers.found(session.get(database.Chat, chat_id))
 
 
 @app.get(
@@ -184,21 +344,26 @@ def get_chat(chat_id: UUID, session: Session = Depends(get_session)):
     tags=["Chats"],
 )
 def get_chats(
+    response: Response,
     external_id: Annotated[
         Optional[str],
         Query(description="Optionally filter to find chats with a given external ID."),
     ] = None,
+    agent_id: Annotated[Optional[UUID], Query(description="Optionally filter to find an agent's chats.")] = None,
+    started_after: Annotated[Optional[datetime], Query(description="Chats started at or after.")] = None,
+    started_before: Annotated[Optional[datetime], Query(description="Chats started before.")] = None,
+    ended_after: Annotated[Optional[datetime], Query(description="Chats ended at or after.")] = None,
+    ended_before: Annotated[Optional[datetime], Query(description="Chats ended before.")] = None,
+    open_only: Annotated[bool, Query(description="Only chats that haven't ended.")] = False,
+    cursor: Annotated[Optional[str], Query(description="X-Next-Cursor header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="Page size.", ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
     session: Session = Depends(get_session),
 ):
     """
-    Get chats.
+    Get chats, a page at a time in the order they started.
     """
-    query = select(database.Chat)
-    if external_id:
-        query = query.where(database.Chat.external_id == external_id)
-
-    chats = session.scalars(query)
-    return chats.all()
+    query = chats_query(external_id, agent_id, started_after, started_before, ended_after, ended_before, open_only)
+    return paginate(session, query, database.Chat.started_at, database.Chat.chat_id, cursor, limit, response)
 
 
 @app.post(
@@ -211,31 +376,27 @@ def get_chats(
 def post_agent(
     data: schemas.AgentCreate,
     response: Response,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_write_session),
 ):
     """
     Create an agent.
     """
-    agent_id = uuid4()
-    agent = database.Agent(agent_id=agent_id, name=data.name, email=data.email)
+    agent = handlers.new_agent(data)
     session.add(agent)
     session.commit()
+    agent_cache.add(agent.agent_id)
     session.refresh(agent)
 
-    response.headers["Location"] = f"/agents/{agent_id}"
+    handlers.created(response, f"/agents/{agent.agent_id}")
     return agent
 
 
-@app.get("/agents/{agent_id}", summary="Get an agent", tags=["Agents"])
+@app.get("/agents/{agent_id}", response_model=schemas.Agent, summary="Get an agent", tags=["Agents"])
 def get_agent(agent_id: UUID, session: Session = Depends(get_session)):
     """
     Get an agent.
     """
-    agent = session.get(database.Agent, agent_id)
-    if not agent:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Agent not found")
-
-    return agent
+    return handlers.found(session.get(database.Agent, agent_id), handlers.AGENT_NOT_FOUND)
 
 
 @app.get("/agents", response_model=List[schemas.Agent], summary="Get agents", tags=["Agents"])
@@ -253,15 +414,7 @@ def get_agents(
     """
     Get agents.
     """
-    query = select(database.Agent)
-    if email:
-        query = query.where(database.Agent.email == email)
-
-    if name:
-        query = query.where(database.Agent.name == name)
-
-    chats = session.scalars(query)
-    return chats.all()
+    return session.scalars(agents_by_query(name, email)).all()
 
 
 if __name__ == "__main__":
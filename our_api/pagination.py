@@ -0,0 +1,67 @@
+import base64
+import binascii
+from datetime import datetime
+from http import HTTPStatus
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(at: datetime, id: UUID) -> str:
+    """
+    Opaque cursor pointing right after the given row.
+    """
+    return base64.urlsafe_b64encode(f"{at.isoformat()}|{id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(at), UUID(id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Invalid cursor.")
+
+
+def _page_query(query: Select, at_column, id_column, cursor: Optional[str], limit: int) -> Select:
+    if cursor:
+        query = query.where(tuple_(at_column, id_column) > tuple_(*decode_cursor(cursor)))
+    # one extra row tells whether there is a next page
+    return query.order_by(at_column, id_column).limit(limit + 1)
+
+
+def _page(rows: List, at_column, id_column, limit: int, response: Response) -> List:
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, at_column.key), getattr(last, id_column.key))
+    return rows
+
+
+def paginate(
+    session: Session, query: Select, at_column, id_column, cursor: Optional[str], limit: int, response: Response
+) -> List:
+    """
+    One page of the query in (at_column, id_column) order using keyset pagination, so every page costs
+    the same no matter how deep it is. The cursor for the next page goes in the X-Next-Cursor header
+    so the body stays a plain list.
+    """
+    rows = session.scalars(_page_query(query, at_column, id_column, cursor, limit)).all()
+    return _page(rows, at_column, id_column, limit, response)
+
+
+async def paginate_async(
+    session: AsyncSession, query: Select, at_column, id_column, cursor: Optional[str], limit: int, response: Response
+) -> List:
+    """
+    Same as paginate for an async session.
+    """
+    rows = (await session.scalars(_page_query(query, at_column, id_column, cursor, limit))).all()
+    return _page(rows, at_column, id_column, limit, response)
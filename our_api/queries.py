@@ -0,0 +1,93 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import Insert, Select, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+import database
+
+
+def chats_query(
+    external_id: Optional[str] = None,
+    agent_id: Optional[UUID] = None,
+    started_after: Optional[datetime] = None,
+    started_before: Optional[datetime] = None,
+    ended_after: Optional[datetime] = None,
+    ended_before: Optional[datetime] = None,
+    open_only: bool = False,
+) -> Select:
+    """
+    Chats matching every filter given.
+    """
+    query = select(database.Chat)
+    if external_id:
+        query = query.where(database.Chat.external_id == external_id)
+    if agent_id:
+        query = query.where(database.Chat.agent_id == agent_id)
+    if started_after:
+        query = query.where(database.Chat.started_at >= started_after)
+    if started_before:
+        query = query.where(database.Chat.started_at < started_before)
+    if ended_after:
+        query = query.where(database.Chat.ended_at >= ended_after)
+    if ended_before:
+        query = query.where(database.Chat.ended_at < ended_before)
+    if open_only:
+        query = query.where(database.Chat.ended_at.is_(None))
+    return query
+
+
+def agents_query(agent_ids: set) -> Select:
+    """
+    Ids of the given agents that exist.
+    """
+    return select(database.Agent.agent_id).where(database.Agent.agent_id.in_(agent_ids))
+
+
+# dialects with INSERT ... ON CONFLICT
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def upsert_chat_query(dialect: str, values: dict, update: dict) -> Insert:
+    """
+    Insert the chat, or edit the given fields of the chat that already has its external ID,
+    in a single statement backed by the unique constraint on external_id.
+    """
+    query = UPSERT_INSERTS[dialect](database.Chat).values(**values)
+    query = query.on_conflict_do_update(index_elements=[database.Chat.external_id], set_=update)
+    return query.returning(database.Chat)
+
+
+def agents_by_query(name: Optional[str] = None, email: Optional[str] = None) -> Select:
+    """
+    Agents with the given name and email address.
+    """
+    query = select(database.Agent)
+    if email:
+        query = query.where(database.Agent.email == email)
+    if name:
+        query = query.where(database.Agent.name == name)
+    return query
+
+
+def chats_by_id_query(chat_ids: set) -> Select:
+    return select(database.Chat).where(database.Chat.chat_id.in_(chat_ids))
+
+
+def chat_ids_query(chat_ids: set) -> Select:
+    """
+    Ids of the given chats that exist.
+    """
+    return select(database.Chat.chat_id).where(database.Chat.chat_id.in_(chat_ids))
+
+
+def taken_external_ids_query(external_ids: set) -> Select:
+    """
+    Which of the given external IDs already have a chat.
+    """
+    return select(database.Chat.external_id).where(database.Chat.external_id.in_(external_ids))
+
+
+def messages_query(chat_id: UUID) -> Select:
+    return select(database.Message).where(database.Message.chat_id == chat_id)
@@ -1,3 +1,4 @@
 from .agent import Agent, AgentCreate
-from .chat import Chat, ChatCreate, ChatUpdate
+from .chat import Chat, ChatCreate, ChatUpdate, ChatUpsert
 from .message import Message, MessageCreate
+from .batch import BatchResult, ChatBatchUpdate
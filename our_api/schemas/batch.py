@@ -0,0 +1,16 @@
+from typing import Optional
+
+from pydantic import Field, BaseModel
+from uuid import UUID
+
+from .chat import ChatUpdate
+
+
+class ChatBatchUpdate(ChatUpdate):
+    chat_id: UUID = Field(description="Chat to edit.")
+
+
+class BatchResult(BaseModel):
+    status: int = Field(description="HTTP status the item would have gotten on its own.")
+    id: Optional[UUID] = Field(description="Chat or message created or edited.", default=None)
+    detail: Optional[str] = Field(description="Why the item was rejected.", default=None)
@@ -28,6 +28,15 @@ class ChatUpdate(BaseModel):
     )
 
 
+class ChatUpsert(BaseModel):
+    agent_id: Optional[UUID] = Field(description="Agent that handled the chat.", default=None)
+    started_at: datetime = Field(description="When the chat started.")
+    ended_at: Optional[datetime] = Field(
+        description="When the chat ended (will be undefined if the chat is ongoing.",
+        default=None,
+    )
+
+
 class Chat(ChatBase):
     chat_id: UUID
 
@@ -0,0 +1,12 @@
+import pytest
+
+from integration.events.utils import (advisor_cache, agent_cache,
+                                      agent_email_cache, missing_chat_cache)
+
+
+@pytest.fixture(autouse=True)
+def clear_agent_caches():
+    advisor_cache.clear()
+    agent_cache.clear()
+    agent_email_cache.clear()
+    missing_chat_cache.clear()
@@ -0,0 +1,19 @@
+from integration.events.constants import EVENT_MESSAGE
+from integration.events.models import parse_event
+
+CONVERSATION_ID = 12345
+EVENT_AT = 1729225018
+
+
+def raw_event(event_name, conversation_id=CONVERSATION_ID, event_at=EVENT_AT, data=None):
+    """An event as BigChat sends it, messages get a text unless one is given"""
+    event = {"event_name": event_name, "conversation_id": conversation_id, "event_at": event_at}
+    if data is None and event_name == EVENT_MESSAGE:
+        data = {"message": "foo bar"}
+    if data:
+        event["data"] = data
+    return event
+
+
+def make_event(event_name, conversation_id=CONVERSATION_ID, event_at=EVENT_AT, data=None):
+    return parse_event(raw_event(event_name, conversation_id, event_at, data))
@@ -0,0 +1,130 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from requests import HTTPError
+
+from integration.backfill import backfill, chunks
+from integration.constants import BIG_CHAT_API, OUR_API
+from integration.events.constants import EVENT_MESSAGE
+from integration.events.pending import pending_events
+from integration.events.utils import chat_cache, missing_chat_cache
+
+START_AT = datetime(2024, 10, 18)
+
+
+class TestChunks:
+    def test_chunks(self):
+        end_at = START_AT + timedelta(seconds=25)
+
+        assert list(chunks(START_AT, end_at, 10)) == [
+            (START_AT, START_AT + timedelta(seconds=10)),
+            (START_AT + timedelta(seconds=10), START_AT + timedelta(seconds=20)),
+            (START_AT + timedelta(seconds=20), end_at),
+        ]
+
+    def test_empty_range(self):
+        assert list(chunks(START_AT, START_AT, 10)) == []
+
+
+def _route(url, params=None):
+    """One event per window named after its start, with a second page for the first window"""
+    if params is None:
+        return MagicMock(json=lambda: {"events": [{"window": "page"}], "nextPageUrl": None}, status_code=200)
+    # later windows answer sooner so they are fetched out of order
+    time.sleep(0.02 if params["start_at"] == START_AT else 0)
+    next_page_url = f"{BIG_CHAT_API}/events?page=1" if params["start_at"] == START_AT else None
+    return MagicMock(
+        json=lambda: {"events": [{"window": params["start_at"]}], "nextPageUrl": next_page_url}, status_code=200
+    )
+
+
+class TestBackfill:
+    @patch("integration.backfill.run_events")
+    @patch("requests.Session.get")
+    def test_windows_are_applied_in_order(self, m_get, m_run_events):
+        m_get.side_effect = _route
+        applied = []
+        m_run_events.side_effect = lambda events, logger, max_concurrency: applied.extend(events)
+
+        events = backfill(START_AT, START_AT + timedelta(seconds=50), MagicMock(), delta_seconds=10)
+
+        assert events == 6
+        assert applied == [
+            {"window": START_AT},
+            {"window": "page"},
+            *({"window": START_AT + timedelta(seconds=seconds)} for seconds in range(10, 50, 10)),
+        ]
+
+    @patch("integration.backfill.run_events")
+    @patch("requests.Session.get")
+    def test_fetches_are_bounded(self, m_get, m_run_events):
+        running, peak = 0, 0
+        lock = threading.Lock()
+
+        def _get(url, params=None):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.01)
+            with lock:
+                running -= 1
+            return MagicMock(json=lambda: {"events": [], "nextPageUrl": None}, status_code=200)
+
+        m_get.side_effect = _get
+
+        backfill(START_AT, START_AT + timedelta(seconds=200), MagicMock(), delta_seconds=10, fetch_concurrency=3)
+
+        assert m_get.call_count == 20
+        assert 1 < peak <= 3
+
+    @patch("integration.backfill.run_events")
+    @patch("requests.Session.get")
+    def test_failure_logs_where_to_resume(self, m_get, m_run_events):
+        response = MagicMock(status_code=404)
+        response.raise_for_status.side_effect = HTTPError(response=response)
+        m_get.side_effect = lambda url, params: (
+            response
+            if params["start_at"] == START_AT + timedelta(seconds=10)
+            else MagicMock(json=lambda: {"events": [], "nextPageUrl": None}, status_code=200)
+        )
+        logger = MagicMock()
+
+        with pytest.raises(HTTPError):
+            backfill(START_AT, START_AT + timedelta(seconds=30), logger, delta_seconds=10, fetch_concurrency=1)
+
+        logger.error.assert_called_once_with(
+            f"Backfill stopped, resume it from {START_AT + timedelta(seconds=10)} to {START_AT + timedelta(seconds=30)}"
+        )
+
+    @patch("requests.Session.post")
+    @patch("requests.Session.get")
+    def test_held_events_are_flushed_at_the_end(self, m_get, m_post):
+        conversation_id, chat_id = 54321, "3fa85f64-5717-4562-b3fc-2c963f66afa6"
+        chat_cache.pop(conversation_id)
+        missing_chat_cache.clear()
+        pending_events.clear()
+        message = {
+            "event_name": EVENT_MESSAGE,
+            "conversation_id": conversation_id,
+            "event_at": 1729225018,
+            "data": {"message": "foo bar"},
+        }
+
+        def _get(url, params=None):
+            if url.startswith(BIG_CHAT_API):
+                return MagicMock(json=lambda: {"events": [message], "nextPageUrl": None}, status_code=200)
+            # the START of the conversation was imported before the range
+            return MagicMock(json=lambda: [{"chat_id": chat_id}], status_code=200)
+
+        m_get.side_effect = _get
+        m_post.return_value = MagicMock(status_code=200)
+
+        backfill(START_AT, START_AT + timedelta(seconds=10), MagicMock(), delta_seconds=10)
+
+        assert len(pending_events) == 0
+        assert m_post.call_args.args == (f"{OUR_API}/chats/{chat_id}/messages",)
+        chat_cache.pop(conversation_id)
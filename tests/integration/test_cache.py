@@ -0,0 +1,80 @@
+from integration.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache:
+    def test_hits_and_misses(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "evictions": 0, "hit_ratio": 0.5}
+
+    def test_lru_eviction(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now the least recently used
+        cache.set("c", 3)
+
+        assert "a" in cache and "c" in cache
+        assert "b" not in cache
+        assert cache.evictions == 1
+
+    def test_ttl(self):
+        clock = FakeClock()
+        cache = LRUCache(10, ttl=5, clock=clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=None)
+
+        clock.now = 5
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert cache.evictions == 1
+
+    def test_peek_does_not_count(self):
+        cache = LRUCache(10)
+        cache.set("a", 1)
+
+        assert cache.peek("a") == 1
+        assert cache.peek("b") is None
+        assert cache.hits == cache.misses == 0
+
+    def test_pop(self):
+        cache = LRUCache(10)
+        cache.set("a", 1)
+
+        assert cache.pop("a") == 1
+        assert cache.pop("a") is None
+        assert len(cache) == 0
+
+    def test_purge(self):
+        clock = FakeClock()
+        cache = LRUCache(10, clock=clock)
+        cache.set("a", 1, ttl=1)
+        cache.set("b", 2)
+
+        clock.now = 1
+        cache.purge()
+
+        assert len(cache) == 1
+        assert cache.evictions == 1
+
+    def test_expired_entries_go_before_lru(self):
+        clock = FakeClock()
+        cache = LRUCache(2, clock=clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=1)
+
+        clock.now = 1
+        cache.set("c", 3)
+
+        assert "a" in cache and "c" in cache
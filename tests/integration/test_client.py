@@ -0,0 +1,35 @@
+from unittest.mock import patch
+
+from requests import Request
+
+from integration.client import ApiClient, TimeoutHTTPAdapter
+
+BASE_URL = "http://localhost:1234"
+
+
+class TestApiClient:
+    def test_url(self):
+        client = ApiClient(BASE_URL, pool_size=2)
+
+        assert client.url("/chats") == f"{BASE_URL}/chats"
+        assert client.url(f"{BASE_URL}/events?page=1") == f"{BASE_URL}/events?page=1"
+
+    def test_pool_and_headers(self):
+        client = ApiClient(BASE_URL, pool_size=3, timeout=1.5, headers={"X-Foo": "bar"})
+
+        adapter = client.session.get_adapter(BASE_URL)
+        assert isinstance(adapter, TimeoutHTTPAdapter)
+        assert adapter.timeout == 1.5
+        assert adapter._pool_maxsize == 3
+        assert client.session.headers["X-Foo"] == "bar"
+        assert client.session.headers["Accept"] == "application/json"
+
+    @patch("requests.adapters.HTTPAdapter.send")
+    def test_default_timeout(self, m_send):
+        adapter = ApiClient(BASE_URL, pool_size=1, timeout=2).session.get_adapter(BASE_URL)
+        request = Request("GET", f"{BASE_URL}/chats").prepare()
+
+        adapter.send(request)
+        adapter.send(request, timeout=7)
+
+        assert [call.kwargs["timeout"] for call in m_send.call_args_list] == [2, 7]
@@ -0,0 +1,53 @@
+from helpers import CONVERSATION_ID, EVENT_AT, make_event
+
+from integration.events.coalesce import coalesce_lane
+from integration.events.constants import (EVENT_END, EVENT_MESSAGE,
+                                          EVENT_START, EVENT_TRANSFER)
+
+
+class TestCoalesceLane:
+    def test_start_and_end(self):
+        lane = [make_event(EVENT_END, CONVERSATION_ID, EVENT_AT + 5), make_event(EVENT_START, CONVERSATION_ID)]
+
+        assert coalesce_lane(lane) == [make_event(EVENT_START, CONVERSATION_ID, EVENT_AT, {"ended_at": EVENT_AT + 5})]
+
+    def test_start_transfers_messages_and_end(self):
+        lane = [
+            make_event(EVENT_START, CONVERSATION_ID, EVENT_AT),
+            make_event(EVENT_TRANSFER, CONVERSATION_ID, EVENT_AT + 3, {"old_advisor_id": 2, "new_advisor_id": 3}),
+            make_event(EVENT_MESSAGE, CONVERSATION_ID, EVENT_AT + 2, {"message": "second"}),
+            make_event(EVENT_MESSAGE, CONVERSATION_ID, EVENT_AT + 1, {"message": "first"}),
+            make_event(EVENT_TRANSFER, CONVERSATION_ID, EVENT_AT + 1, {"old_advisor_id": 1, "new_advisor_id": 2}),
+            make_event(EVENT_END, CONVERSATION_ID, EVENT_AT + 4),
+        ]
+
+        assert coalesce_lane(lane) == [
+            make_event(EVENT_START, CONVERSATION_ID, EVENT_AT, {"new_advisor_id": 3, "ended_at": EVENT_AT + 4}),
+            make_event(EVENT_MESSAGE, CONVERSATION_ID, EVENT_AT + 1, {"message": "first"}),
+            make_event(EVENT_MESSAGE, CONVERSATION_ID, EVENT_AT + 2, {"message": "second"}),
+        ]
+
+    def test_transfers_collapse_to_last(self):
+        lane = [
+            make_event(EVENT_TRANSFER, CONVERSATION_ID, EVENT_AT + 2, {"new_advisor_id": 3}),
+            make_event(EVENT_TRANSFER, CONVERSATION_ID, EVENT_AT + 1, {"new_advisor_id": 2}),
+        ]
+
+        assert coalesce_lane(lane) == [make_event(EVENT_TRANSFER, CONVERSATION_ID, EVENT_AT + 2, {"new_advisor_id": 3})]
+
+    def test_transfer_folded_into_end(self):
+        lane = [
+            make_event(EVENT_END, CONVERSATION_ID, EVENT_AT + 2),
+            make_event(EVENT_MESSAGE, CONVERSATION_ID, EVENT_AT, {"message": "foo bar"}),
+            make_event(EVENT_TRANSFER, CONVERSATION_ID, EVENT_AT + 1, {"new_advisor_id": 2}),
+        ]
+
+        assert coalesce_lane(lane) == [
+            make_event(EVENT_MESSAGE, CONVERSATION_ID, EVENT_AT, {"message": "foo bar"}),
+            make_event(EVENT_END, CONVERSATION_ID, EVENT_AT + 2, {"new_advisor_id": 2}),
+        ]
+
+    def test_nothing_to_merge(self):
+        lane = [make_event(EVENT_MESSAGE, CONVERSATION_ID, EVENT_AT, {"message": "foo bar"})]
+
+        assert coalesce_lane(lane) == lane
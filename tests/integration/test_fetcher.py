@@ -0,0 +1,70 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from requests import HTTPError
+
+from integration.constants import BIG_CHAT_API
+from integration.fetcher import fetch_pages
+
+START_AT = "2024-10-18 00:00:00"
+END_AT = "2024-10-18 00:00:10"
+
+
+def _page(number, last=5):
+    return {
+        "nextPageUrl": f"{BIG_CHAT_API}/events?page={number + 1}" if number < last else None,
+        "events": [{"page": number}],
+    }
+
+
+def _route(url, **kwargs):
+    number = int(url.split("page=")[1]) if "page=" in url else 0
+    return MagicMock(json=lambda: _page(number), status_code=200)
+
+
+class TestFetchPages:
+    @patch("requests.Session.get")
+    def test_all_pages_in_order(self, m_get):
+        m_get.side_effect = _route
+
+        assert [events[0]["page"] for events in fetch_pages(START_AT, END_AT)] == [0, 1, 2, 3, 4, 5]
+
+    @patch("requests.Session.get")
+    def test_next_page_is_prefetched(self, m_get):
+        fetched = threading.Event()
+
+        def _get(url, **kwargs):
+            if "page=1" in url:
+                fetched.set()
+            return _route(url)
+
+        m_get.side_effect = _get
+        pages = fetch_pages(START_AT, END_AT)
+        next(pages)
+
+        # page 1 is requested while page 0 is still being processed
+        assert fetched.wait(1)
+        pages.close()
+
+    @patch("requests.Session.get")
+    def test_read_ahead_is_bounded(self, m_get):
+        m_get.side_effect = _route
+        pages = fetch_pages(START_AT, END_AT, read_ahead=1)
+        next(pages)
+        threading.Event().wait(0.3)  # give the producer time to run ahead
+
+        # the page being yielded, one buffered and one waiting for room
+        assert m_get.call_count <= 3
+        pages.close()
+
+    @patch("requests.Session.get")
+    def test_error_is_raised(self, m_get):
+        error_response = MagicMock()
+        error_response.raise_for_status.side_effect = HTTPError("502")
+        m_get.side_effect = [_route(f"{BIG_CHAT_API}/events"), error_response]
+
+        pages = fetch_pages(START_AT, END_AT)
+        next(pages)
+        with pytest.raises(HTTPError):
+            next(pages)
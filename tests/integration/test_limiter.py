@@ -0,0 +1,144 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from integration.client import ApiClient
+from integration.limiter import AdaptiveLimiter
+from integration.metrics import error_rate
+
+BASE_URL = "http://localhost:1234"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+def _limiter(**kwargs):
+    clock = FakeClock()
+    options = {"initial": 4, "minimum": 1, "maximum": 10, "target_latency": 0.1, "clock": clock, "sleep": clock.sleep}
+    return AdaptiveLimiter(**{**options, **kwargs}), clock
+
+
+def _request(limiter, latency, failed=False):
+    limiter.acquire()
+    limiter.release(latency, failed)
+
+
+class TestAdaptiveLimiter:
+    def test_additive_increase(self):
+        limiter, _ = _limiter()
+
+        for _ in range(4):
+            _request(limiter, 0.01)
+
+        assert 4.9 < limiter.limit < 5
+
+    def test_multiplicative_decrease_on_error(self):
+        limiter, clock = _limiter()
+
+        _request(limiter, 0.01, failed=True)
+        assert limiter.limit == 2
+
+        _request(limiter, 0.01, failed=True)  # inside the cooldown
+        assert limiter.limit == 2
+
+        clock.now += 1
+        _request(limiter, 0.01, failed=True)
+        assert limiter.limit == 1
+
+        clock.now += 1
+        _request(limiter, 0.01, failed=True)
+        assert limiter.limit == 1  # never under the minimum
+        assert limiter.error_rate > 0
+
+    def test_decrease_on_error_rate(self):
+        limiter, clock = _limiter(max_error_rate=0.3)
+
+        _request(limiter, 0.01, failed=True)  # a lone error keeps the rate under the threshold
+        assert limiter.limit == 4.25
+
+        clock.now += 1
+        _request(limiter, 0.01, failed=True)
+        assert limiter.limit == 2.125
+
+    def test_no_increase_while_error_rate_is_high(self):
+        limiter, _ = _limiter()
+
+        _request(limiter, 0.01, failed=True)
+        for _ in range(2):
+            _request(limiter, 0.01)
+        assert limiter.limit == 2
+
+        for _ in range(2):
+            _request(limiter, 0.01)
+        assert limiter.error_rate < 0.1
+        assert limiter.limit == 2.5
+
+    def test_decrease_on_latency(self):
+        limiter, _ = _limiter(smoothing=1)
+
+        _request(limiter, 0.5)
+
+        assert limiter.limit == 2
+
+    def test_never_over_maximum(self):
+        limiter, _ = _limiter(maximum=5)
+
+        for _ in range(100):
+            _request(limiter, 0.01)
+
+        assert limiter.limit == 5
+
+    def test_in_flight_is_capped(self):
+        limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=2, target_latency=10)
+        running, peak = 0, 0
+        lock = threading.Lock()
+
+        def _work():
+            nonlocal running, peak
+            limiter.acquire()
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+            limiter.release(0.02)
+
+        threads = [threading.Thread(target=_work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert peak == 2
+        assert limiter.in_flight == 0
+
+    def test_max_rps(self):
+        limiter, clock = _limiter(max_rps=10)
+
+        for _ in range(3):
+            _request(limiter, 0.01)
+
+        assert clock.sleeps == [0.1, 0.2]
+
+
+class TestClientLimiter:
+    @patch("requests.Session.get")
+    def test_server_errors_shrink_the_limit(self, m_get):
+        m_get.return_value = MagicMock(status_code=503)
+        limiter = AdaptiveLimiter(initial=8, minimum=1, maximum=8, target_latency=10)
+
+        ApiClient(BASE_URL, pool_size=8, limiter=limiter).get("/chats")
+
+        assert limiter.limit == 4
+        assert limiter.in_flight == 0
+        assert error_rate.value(api="api") == limiter.error_rate == 0.2
@@ -1,27 +1,38 @@
 from unittest.mock import MagicMock, call, patch
 
 import pytest
+from helpers import CONVERSATION_ID, EVENT_AT
 
 from integration import main
 from integration.constants import BIG_CHAT_API, OUR_API
+from integration.dead_letter import DeadLetterQueue
 from integration.events.constants import (EVENT_END, EVENT_MESSAGE,
                                           EVENT_START, EVENT_TRANSFER)
+from integration.events.pending import pending_events
 from integration.events.utils import chat_cache
 
-CONVERSATION_ID = 12345
 START_AT = "2024-10-18 00:00:00"
 END_AT = "2024-10-18 00:00:10"
-EVENT_AT = 1729225018
 CHAT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
 MESSAGE = "foo bar"
 AGENT_ID = "efa505ac-d1b6-4b83-92f4-2f67ef03aff9"
 AGENT_NAME = "Jhon"
 EMAIL_NAME = "jhon@domain.com"
+NEXT_PAGE_URL = f"{BIG_CHAT_API}/events?page=1"
+
+
+@pytest.fixture(autouse=True)
+def no_pending_wait():
+    """Events for unknown chats are looked up right away unless a test says otherwise"""
+    pending_events.clear()
+    with patch.object(pending_events, "timeout", 0):
+        yield
+    pending_events.clear()
 
 
 class TestMainStart:
-    @patch("requests.get")
-    @patch("requests.post")
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
     def test_start_existent_agent(self, m_post, m_get):
         m_get.side_effect = [
             MagicMock(
@@ -51,8 +62,8 @@ class TestMainStart:
             ),
         ]
 
-    @patch("requests.get")
-    @patch("requests.post")
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
     def test_start_non_existent_agent(self, m_post, m_get):
         m_get.side_effect = [
             MagicMock(
@@ -87,9 +98,54 @@ class TestMainStart:
         ]
 
 
+class TestMainCoalesce:
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
+    def test_start_end_and_message(self, m_post, m_get):
+        chat_cache.clear()
+        m_get.side_effect = [
+            MagicMock(
+                json=lambda: {
+                    "events": [
+                        {"event_name": EVENT_END, "conversation_id": CONVERSATION_ID, "event_at": EVENT_AT + 2},
+                        {
+                            "event_name": EVENT_MESSAGE,
+                            "conversation_id": CONVERSATION_ID,
+                            "event_at": EVENT_AT + 1,
+                            "data": {"message": MESSAGE},
+                        },
+                        {"event_name": EVENT_START, "conversation_id": CONVERSATION_ID, "event_at": EVENT_AT},
+                    ]
+                },
+                status_code=200,
+            ),
+            MagicMock(json=lambda: {"advisor_id": "foo"}, status_code=200),
+            MagicMock(json=lambda: {"name": AGENT_NAME, "email_address": EMAIL_NAME}, status_code=200),
+            MagicMock(json=lambda: [{"agent_id": AGENT_ID}], status_code=200),
+        ]
+        m_post.return_value = MagicMock(json=lambda: {"chat_id": CHAT_ID}, status_code=201)
+
+        main.main(START_AT, END_AT)
+
+        # no PATCH for the END and no chat lookup for the MESSAGE
+        assert m_get.call_count == 4
+        assert m_post.call_args_list == [
+            call(
+                f"{OUR_API}/chats",
+                json={
+                    "external_id": str(CONVERSATION_ID),
+                    "started_at": EVENT_AT,
+                    "agent_id": AGENT_ID,
+                    "ended_at": EVENT_AT + 2,
+                },
+            ),
+            call(f"{OUR_API}/chats/{CHAT_ID}/messages", json={"sent_at": EVENT_AT + 1, "text": MESSAGE}),
+        ]
+
+
 class TestMainEnd:
-    @patch("requests.get")
-    @patch("requests.patch")
+    @patch("requests.Session.get")
+    @patch("requests.Session.patch")
     @pytest.mark.parametrize(
         "chat_retrieval_response",
         (
@@ -121,10 +177,30 @@ class TestMainEnd:
         else:
             assert m_patch.call_args_list == []
 
+    @patch("requests.Session.get")
+    @patch("requests.Session.patch")
+    @patch("integration.events.events.CHAT_CACHE_END_GRACE", 0)
+    def test_end_evicts_chat(self, m_patch, m_get):
+        chat_cache.clear()
+        chat_cache.set(CONVERSATION_ID, CHAT_ID)
+        m_get.return_value = MagicMock(
+            json=lambda: {
+                "nextPageUrl": None,
+                "events": [{"event_name": EVENT_END, "conversation_id": CONVERSATION_ID, "event_at": EVENT_AT}],
+            },
+            status_code=200,
+        )
+
+        main.main(START_AT, END_AT)
+
+        assert m_patch.call_args_list == [call(f"{OUR_API}/chats/{CHAT_ID}", json={"ended_at": EVENT_AT})]
+        assert CONVERSATION_ID not in chat_cache
+        assert chat_cache.stats()["evictions"] == 1
+
 
 class TestMainMessage:
-    @patch("requests.get")
-    @patch("requests.post")
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
     @pytest.mark.parametrize(
         "chat_retrieval_response",
         (
@@ -167,9 +243,9 @@ class TestMainMessage:
 
 
 class TestMainTransfer:
-    @patch("requests.get")
-    @patch("requests.post")
-    @patch("requests.patch")
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
+    @patch("requests.Session.patch")
     @pytest.mark.parametrize(
         "chat_retrieval_response",
         (
@@ -218,9 +294,9 @@ class TestMainTransfer:
             assert m_patch.call_args_list == []
             assert m_post.call_args_list == []
 
-    @patch("requests.get")
-    @patch("requests.post")
-    @patch("requests.patch")
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
+    @patch("requests.Session.patch")
     @pytest.mark.parametrize(
         "chat_retrieval_response",
         (
@@ -272,46 +348,43 @@ class TestMainTransfer:
 
 
 class TestMainPagination:
-    @patch("requests.get")
-    @patch("requests.post")
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
     def test_pagination(self, m_post, m_get):
-        m_get.side_effect = [
-            MagicMock(
-                json=lambda: {
-                    "nextPageUrl": "whatever",
-                    "events": [{"event_name": EVENT_START, "conversation_id": CONVERSATION_ID, "event_at": EVENT_AT}],
-                },
-                status_code=200,
-            ),
-            MagicMock(json=lambda: {"advisor_id": "foo"}, status_code=200),
-            MagicMock(json=lambda: {"name": AGENT_NAME, "email_address": EMAIL_NAME}, status_code=200),
-            MagicMock(json=lambda: [{"agent_id": AGENT_ID}], status_code=200),
-            MagicMock(
-                json=lambda: {
-                    "nextPageUrl": None,
-                    "events": [
-                        {"event_name": EVENT_START, "conversation_id": CONVERSATION_ID + 1, "event_at": EVENT_AT + 1}
-                    ],
-                },
-                status_code=200,
-            ),
-            MagicMock(json=lambda: {"advisor_id": "foo"}, status_code=200),
-            MagicMock(json=lambda: {"name": AGENT_NAME, "email_address": EMAIL_NAME}, status_code=200),
-            MagicMock(json=lambda: [{"agent_id": AGENT_ID}], status_code=200),
-        ]
+        # the next page is prefetched while the current one is processed so responses are routed by URL
+        responses = {
+            f"{BIG_CHAT_API}/events": {
+                "nextPageUrl": NEXT_PAGE_URL,
+                "events": [{"event_name": EVENT_START, "conversation_id": CONVERSATION_ID, "event_at": EVENT_AT}],
+            },
+            NEXT_PAGE_URL: {
+                "nextPageUrl": None,
+                "events": [
+                    {"event_name": EVENT_START, "conversation_id": CONVERSATION_ID + 1, "event_at": EVENT_AT + 1}
+                ],
+            },
+            f"{BIG_CHAT_API}/conversations/{CONVERSATION_ID}": {"advisor_id": "foo"},
+            f"{BIG_CHAT_API}/conversations/{CONVERSATION_ID + 1}": {"advisor_id": "foo"},
+            f"{BIG_CHAT_API}/advisors/foo": {"name": AGENT_NAME, "email_address": EMAIL_NAME},
+            f"{OUR_API}/agents?email={EMAIL_NAME}": [{"agent_id": AGENT_ID}],
+        }
+        m_get.side_effect = lambda url, **kwargs: MagicMock(json=lambda: responses[url], status_code=200)
+        m_post.return_value = MagicMock(json=lambda: {"chat_id": CHAT_ID}, status_code=201)
 
         main.main(START_AT, END_AT)
 
-        assert m_get.call_args_list == [
-            call(f"{BIG_CHAT_API}/events", params={"start_at": START_AT, "end_at": END_AT}),
-            call(f"{BIG_CHAT_API}/conversations/{CONVERSATION_ID}"),
-            call(f"{BIG_CHAT_API}/advisors/foo"),
-            call(f"{OUR_API}/agents?email={EMAIL_NAME}"),
-            call("whatever"),
-            call(f"{BIG_CHAT_API}/conversations/{CONVERSATION_ID + 1}"),
-            call(f"{BIG_CHAT_API}/advisors/foo"),
-            call(f"{OUR_API}/agents?email={EMAIL_NAME}"),
-        ]
+        assert m_get.call_args_list[0] == call(
+            f"{BIG_CHAT_API}/events", params={"start_at": START_AT, "end_at": END_AT}
+        )
+        assert sorted(m_get.call_args_list[1:]) == sorted(
+            [
+                call(f"{BIG_CHAT_API}/conversations/{CONVERSATION_ID}"),
+                call(f"{BIG_CHAT_API}/advisors/foo"),
+                call(f"{OUR_API}/agents?email={EMAIL_NAME}"),
+                call(NEXT_PAGE_URL),
+                call(f"{BIG_CHAT_API}/conversations/{CONVERSATION_ID + 1}"),  # agent resolution is cached
+            ]
+        )
         assert m_post.call_args_list == [
             call(
                 f"{OUR_API}/chats",
@@ -322,3 +395,39 @@ class TestMainPagination:
                 json={"external_id": str(CONVERSATION_ID + 1), "started_at": EVENT_AT + 1, "agent_id": AGENT_ID},
             ),
         ]
+
+
+class TestReplayDeadLetters:
+    @patch("integration.main.run_events")
+    def test_replay(self, m_run_events, tmp_path):
+        dead_letter_queue = DeadLetterQueue(str(tmp_path / "dead_letters.jsonl"))
+        event = {"event_name": EVENT_END, "conversation_id": CONVERSATION_ID, "event_at": EVENT_AT}
+        dead_letter_queue.put(event, "HTTPError()")
+
+        with patch("integration.main.dead_letters", dead_letter_queue):
+            main.replay_dead_letters()
+
+        assert m_run_events.call_args.args[0] == [event]
+        assert len(dead_letter_queue) == 0
+
+    @patch("integration.main.run_events")
+    def test_entries_are_kept_when_the_replay_dies(self, m_run_events, tmp_path):
+        dead_letter_queue = DeadLetterQueue(str(tmp_path / "dead_letters.jsonl"))
+        event = {"event_name": EVENT_END, "conversation_id": CONVERSATION_ID, "event_at": EVENT_AT}
+        dead_letter_queue.put(event, "HTTPError()")
+        m_run_events.side_effect = KeyboardInterrupt
+
+        with patch("integration.main.dead_letters", dead_letter_queue), pytest.raises(KeyboardInterrupt):
+            main.replay_dead_letters()
+        newer = {**event, "event_at": EVENT_AT + 1}
+        dead_letter_queue.put(newer, "HTTPError()")
+
+        # the interrupted replay goes first, the newer entries wait for the next one
+        m_run_events.side_effect = None
+        with patch("integration.main.dead_letters", dead_letter_queue):
+            main.replay_dead_letters()
+            assert m_run_events.call_args.args[0] == [event]
+            main.replay_dead_letters()
+            assert m_run_events.call_args.args[0] == [newer]
+        assert len(dead_letter_queue) == 0
+        assert not (tmp_path / "dead_letters.jsonl.draining").exists()
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from integration.cache import LRUCache
+from integration.client import ApiClient
+from integration.events.constants import EVENT_START
+from integration.events.pipeline import run_events
+from integration.metrics import (Counter, Histogram, Registry, endpoint,
+                                 event_seconds, http_requests, observe_window,
+                                 registry, start_metrics_server, window_lag)
+
+BASE_URL = "http://localhost:1234"
+CHAT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
+
+
+class TestMetrics:
+    def test_endpoint(self):
+        assert endpoint(f"{BASE_URL}/chats/{CHAT_ID}/messages") == "/chats/{id}/messages"
+        assert endpoint(f"{BASE_URL}/advisors/12") == "/advisors/{id}"
+        assert endpoint(f"{BASE_URL}/agents?email=foo@bar.com") == "/agents"
+
+    def test_render(self):
+        test_registry = Registry()
+        counter = test_registry.register(Counter("calls_total", "Calls"))
+        histogram = test_registry.register(Histogram("latency_seconds", "Latency", buckets=(0.1, 1)))
+        cache = LRUCache(10)
+        test_registry.register_cache("chat", cache)
+        counter.inc(api="our_api")
+        histogram.observe(0.5, api="our_api")
+        cache.set(1, "a")
+        cache.get(1)
+
+        text = test_registry.render()
+
+        assert "# TYPE calls_total counter" in text
+        assert 'calls_total{api="our_api"} 1' in text
+        assert 'latency_seconds_bucket{api="our_api",le="0.1"} 0' in text
+        assert 'latency_seconds_bucket{api="our_api",le="1"} 1' in text
+        assert 'latency_seconds_bucket{api="our_api",le="+Inf"} 1' in text
+        assert 'latency_seconds_count{api="our_api"} 1' in text
+        assert 'integration_cache_hit_ratio{cache="chat"} 1.0' in text
+
+    @patch("requests.Session.get")
+    def test_http_calls_are_counted(self, m_get):
+        m_get.return_value = MagicMock(status_code=200)
+        registry.clear()
+
+        ApiClient(BASE_URL, pool_size=1, name="our_api").get(f"/chats/{CHAT_ID}/messages")
+
+        assert http_requests.value(api="our_api", method="GET", endpoint="/chats/{id}/messages", status=200) == 1
+
+    @patch("integration.events.pipeline.process_event")
+    def test_event_latency(self, m_process_event):
+        registry.clear()
+
+        run_events([{"event_name": EVENT_START, "conversation_id": 1, "event_at": 0}], MagicMock())
+
+        assert ("integration_event_seconds_count", (("event_name", EVENT_START),), 1) in list(event_seconds.samples())
+
+    def test_window_lag(self):
+        observe_window(datetime.now() - timedelta(seconds=30))
+
+        assert 30 <= window_lag.value() < 31
+
+    def test_server(self):
+        server = start_metrics_server(0)
+        try:
+            response = requests.get(f"http://127.0.0.1:{server.server_port}/metrics")
+        finally:
+            server.shutdown()
+
+        assert response.status_code == 200
+        assert "integration_http_requests_total" in response.text
@@ -0,0 +1,85 @@
+from unittest.mock import MagicMock
+
+import pytest
+from helpers import CONVERSATION_ID, EVENT_AT
+
+from integration.events.constants import (EVENT_END, EVENT_MESSAGE,
+                                          EVENT_START, EVENT_TRANSFER)
+from integration.events.models import (EndEvent, InvalidEvent, MessageEvent,
+                                       StartEvent, TransferEvent, parse_event,
+                                       parse_events)
+from integration.metrics import events_invalid
+
+
+def _raw(event_name, data=None, **overrides):
+    raw = {"event_name": event_name, "conversation_id": CONVERSATION_ID, "event_at": EVENT_AT, "data": data}
+    return {**raw, **overrides}
+
+
+class TestParseEvent:
+    @pytest.mark.parametrize(
+        "raw, expected",
+        [
+            (_raw(EVENT_START), StartEvent(CONVERSATION_ID, EVENT_AT)),
+            (_raw(EVENT_END), EndEvent(CONVERSATION_ID, EVENT_AT)),
+            (_raw(EVENT_MESSAGE, {"message": "foo bar"}), MessageEvent(CONVERSATION_ID, EVENT_AT, "foo bar")),
+            (
+                _raw(EVENT_TRANSFER, {"old_advisor_id": 1, "new_advisor_id": 2}),
+                TransferEvent(CONVERSATION_ID, EVENT_AT, 2),
+            ),
+            # ids sent as strings are still integers
+            (_raw(EVENT_TRANSFER, {"new_advisor_id": "2"}, conversation_id="12345"), TransferEvent(12345, EVENT_AT, 2)),
+        ],
+    )
+    def test_valid(self, raw, expected):
+        event = parse_event(raw)
+
+        assert event == expected
+        assert event.event_name == raw["event_name"]
+        assert not hasattr(event, "__dict__")
+
+    @pytest.mark.parametrize(
+        "raw",
+        [
+            None,
+            _raw("FOO"),
+            _raw(EVENT_START, conversation_id=None),
+            _raw(EVENT_START, event_at="yesterday"),
+            _raw(EVENT_START, event_at=True),
+            _raw(EVENT_START, conversation_id="--5"),
+            _raw(EVENT_START, conversation_id="²"),
+            _raw(EVENT_START, data=[1]),
+            _raw(EVENT_MESSAGE),
+            _raw(EVENT_MESSAGE, {"message": 1}),
+            _raw(EVENT_MESSAGE, {"message": ""}),
+            _raw(EVENT_MESSAGE, {"message": " a "}),
+            _raw(EVENT_TRANSFER, {"old_advisor_id": 1}),
+        ],
+    )
+    def test_invalid(self, raw):
+        with pytest.raises(InvalidEvent):
+            parse_event(raw)
+
+    def test_to_dict_round_trip(self):
+        event = StartEvent(CONVERSATION_ID, EVENT_AT, ended_at=EVENT_AT + 1)
+
+        assert event.to_dict() == {
+            "event_name": EVENT_START,
+            "conversation_id": CONVERSATION_ID,
+            "event_at": EVENT_AT,
+            "data": {"ended_at": EVENT_AT + 1},
+        }
+        assert parse_event(event.to_dict()) == event
+        assert "data" not in StartEvent(CONVERSATION_ID, EVENT_AT).to_dict()
+
+
+class TestParseEvents:
+    def test_invalid_are_dropped(self):
+        events_invalid.clear()
+        logger = MagicMock()
+
+        events = parse_events([_raw(EVENT_MESSAGE), _raw(EVENT_END)], logger)
+
+        assert events == [EndEvent(CONVERSATION_ID, EVENT_AT)]
+        assert events_invalid.total() == 1
+        logger.error.assert_called_once()
@@ -0,0 +1,48 @@
+from helpers import EVENT_AT, make_event
+
+from integration.events.constants import EVENT_END, EVENT_MESSAGE
+from integration.events.pending import PendingEvents
+
+
+class TestPendingEvents:
+    def test_release_in_event_at_order(self):
+        pending = PendingEvents(timeout=30)
+        end, message = make_event(EVENT_END, 1, EVENT_AT + 1), make_event(EVENT_MESSAGE, 1)
+        pending.hold(end)
+        pending.hold(message)
+
+        assert pending.has(1)
+        assert pending.release(1) == [message, end]
+        assert not pending.has(1)
+        assert pending.release(1) == []
+
+    def test_expired(self):
+        now = 0
+        pending = PendingEvents(timeout=30, clock=lambda: now)
+        pending.hold(make_event(EVENT_MESSAGE, 1))
+        now = 10
+        pending.hold(make_event(EVENT_MESSAGE, 2))
+
+        now = 30
+        assert pending.expired() == [[make_event(EVENT_MESSAGE, 1)]]
+        assert pending.has(2)
+        now = 40
+        assert pending.expired() == [[make_event(EVENT_MESSAGE, 2)]]
+        assert len(pending) == 0
+
+    def test_oldest_expire_when_full(self):
+        pending = PendingEvents(timeout=30, max_conversations=2, clock=lambda: 0)
+        for conversation_id in range(3):
+            pending.hold(make_event(EVENT_MESSAGE, conversation_id))
+
+        assert pending.expired() == [[make_event(EVENT_MESSAGE, 0)]]
+        assert len(pending) == 2
+
+    def test_expire_all(self):
+        pending = PendingEvents(timeout=30, clock=lambda: 0)
+        pending.hold(make_event(EVENT_MESSAGE, 1))
+        pending.hold(make_event(EVENT_END, 2))
+
+        assert pending.expired() == []
+        assert pending.expire_all() == [[make_event(EVENT_MESSAGE, 1)], [make_event(EVENT_END, 2)]]
+        assert len(pending) == 0
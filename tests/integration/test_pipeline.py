@@ -0,0 +1,190 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from helpers import EVENT_AT, make_event
+from requests import HTTPError, ReadTimeout
+
+from integration.dead_letter import DeadLetterQueue
+from integration.events.constants import EVENT_END, EVENT_MESSAGE, EVENT_START
+from integration.events.pending import PendingEvents
+from integration.events.pipeline import group_by_conversation, run_events
+from integration.events.utils import agent_cache, chat_cache
+
+
+class TestPipeline:
+    def test_group_by_conversation(self):
+        events = [
+            make_event(EVENT_START, 1),
+            make_event(EVENT_START, 2),
+            make_event(EVENT_MESSAGE, 1),
+            make_event(EVENT_END, 1),
+        ]
+
+        lanes = group_by_conversation(events)
+
+        assert lanes == {1: [events[0], events[2], events[3]], 2: [events[1]]}
+
+    @patch("integration.events.pipeline.process_event")
+    def test_order_within_conversation(self, m_process_event):
+        processed = []
+        lock = threading.Lock()
+
+        def _process(event, logger):
+            time.sleep(0.01 if event.event_name == EVENT_START else 0)
+            with lock:
+                processed.append((event.conversation_id, event.event_name))
+
+        m_process_event.side_effect = _process
+        events = []
+        for conversation_id in range(5):
+            events += [
+                make_event(EVENT_START, conversation_id),
+                make_event(EVENT_MESSAGE, conversation_id),
+                make_event(EVENT_END, conversation_id),
+            ]
+
+        run_events(events, MagicMock(), max_concurrency=4, coalesce=False, pending=None)
+
+        for conversation_id in range(5):
+            assert [name for conv, name in processed if conv == conversation_id] == [
+                EVENT_START,
+                EVENT_MESSAGE,
+                EVENT_END,
+            ]
+
+    @patch("integration.events.pipeline.process_event")
+    def test_concurrency_cap(self, m_process_event):
+        running, peak = 0, 0
+        lock = threading.Lock()
+
+        def _process(event, logger):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+        m_process_event.side_effect = _process
+
+        run_events([make_event(EVENT_START, conversation_id) for conversation_id in range(10)], MagicMock(), 3)
+
+        assert 1 < peak <= 3
+
+    @patch("integration.events.pipeline.process_event")
+    def test_error_is_raised_after_all_lanes(self, m_process_event):
+        m_process_event.side_effect = [ValueError("boom"), None, None]
+
+        with pytest.raises(ValueError):
+            run_events(
+                [make_event(EVENT_START, 1), make_event(EVENT_START, 2), make_event(EVENT_START, 3)],
+                MagicMock(),
+                1,
+                dead_letter_queue=None,
+            )
+
+        assert m_process_event.call_count == 3
+
+    @patch("integration.events.pipeline.process_event")
+    def test_failed_lane_is_dead_lettered(self, m_process_event, tmp_path):
+        m_process_event.side_effect = lambda event, logger: event.conversation_id == 1 and 1 / 0
+        dead_letter_queue = DeadLetterQueue(str(tmp_path / "dead_letters.jsonl"))
+        events = [
+            make_event(EVENT_START, 1),
+            make_event(EVENT_START, 2),
+            make_event(EVENT_MESSAGE, 1),
+            make_event(EVENT_END, 2),
+        ]
+
+        run_events(events, MagicMock(), coalesce=False, dead_letter_queue=dead_letter_queue, pending=None)
+
+        # the other conversation goes on, the failed one is kept whole and in order
+        assert m_process_event.call_count == 3
+        with dead_letter_queue.drain() as entries:
+            assert [entry["event"] for entry in entries] == [events[0].to_dict(), events[2].to_dict()]
+            assert entries[0]["error"] == "ZeroDivisionError('division by zero')"
+        assert len(dead_letter_queue) == 0
+
+    @patch("integration.retry.backoff", return_value=0)
+    @patch("integration.events.pipeline.process_event")
+    def test_transient_errors_are_retried(self, m_process_event, m_backoff):
+        response = MagicMock(status_code=502)
+        m_process_event.__name__ = "process_event"
+        m_process_event.side_effect = [HTTPError(response=response), HTTPError(response=response), None]
+
+        run_events([make_event(EVENT_START, 1)], MagicMock(), dead_letter_queue=None)
+
+        assert m_process_event.call_count == 3
+
+    @patch("integration.retry.backoff", return_value=0)
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
+    def test_start_committed_before_a_timeout_is_not_created_again(self, m_post, m_get, m_backoff, tmp_path):
+        chat_cache.clear()
+        agent_cache.set(2, "agent")
+        m_get.side_effect = lambda url: MagicMock(
+            json=lambda: [{"chat_id": "chat"}] if "/chats" in url else {"advisor_id": 2}, status_code=200
+        )
+        conflict = MagicMock(status_code=409)
+        conflict.raise_for_status.side_effect = HTTPError(response=conflict)
+        m_post.side_effect = [ReadTimeout(), conflict]
+        dead_letter_queue = DeadLetterQueue(str(tmp_path / "dead_letters.jsonl"))
+
+        run_events(
+            [make_event(EVENT_START, 1), make_event(EVENT_END, 1, EVENT_AT + 1)],
+            MagicMock(),
+            coalesce=True,
+            dead_letter_queue=dead_letter_queue,
+        )
+
+        # the END was coalesced into the START, so it was in the chat the first attempt committed
+        assert m_post.call_count == 2
+        assert m_post.call_args.kwargs["json"]["ended_at"] == EVENT_AT + 1
+        assert chat_cache.peek(1) == "chat"
+        assert len(dead_letter_queue) == 0
+
+    @patch("integration.events.pipeline.process_event")
+    def test_events_before_start_wait_for_it(self, m_process_event):
+        chat_cache.clear()
+        processed = []
+
+        def _process(event, logger):
+            processed.append(event.event_name)
+            if event.event_name == EVENT_START:
+                chat_cache.set(event.conversation_id, "chat")
+
+        m_process_event.side_effect = _process
+        pending = PendingEvents(timeout=60)
+
+        run_events([make_event(EVENT_MESSAGE, 1, EVENT_AT + 1)], MagicMock(), coalesce=False, pending=pending)
+        assert processed == []
+        assert len(pending) == 1
+
+        run_events(
+            [make_event(EVENT_START, 1), make_event(EVENT_END, 1, EVENT_AT + 2)],
+            MagicMock(),
+            coalesce=False,
+            pending=pending,
+        )
+        assert processed == [EVENT_START, EVENT_MESSAGE, EVENT_END]
+        assert len(pending) == 0
+        chat_cache.clear()
+
+    @patch("integration.events.pipeline.process_event")
+    def test_events_waiting_too_long_are_processed(self, m_process_event):
+        chat_cache.clear()
+        now = 0
+        pending = PendingEvents(timeout=30, clock=lambda: now)
+        events = [make_event(EVENT_END, 1, EVENT_AT + 1), make_event(EVENT_MESSAGE, 1)]
+
+        run_events(events, MagicMock(), coalesce=False, pending=pending)
+        assert m_process_event.call_count == 0
+
+        now = 30
+        run_events([], MagicMock(), pending=pending)
+        # processed in event_at order, the handlers look the chat up themselves
+        assert [args[0] for args, _ in m_process_event.call_args_list] == [events[1], events[0]]
+        assert len(pending) == 0
@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock
+
+import pytest
+from requests import ConnectionError, HTTPError
+
+from integration.retry import backoff, is_transient, retry
+
+
+def _http_error(status_code):
+    return HTTPError(response=MagicMock(status_code=status_code))
+
+
+class TestRetry:
+    @pytest.mark.parametrize(
+        "exception, transient",
+        (
+            (_http_error(502), True),
+            (_http_error(429), True),
+            (_http_error(404), False),
+            (ConnectionError(), True),
+            (KeyError("foo"), False),
+        ),
+    )
+    def test_is_transient(self, exception, transient):
+        assert is_transient(exception) is transient
+
+    def test_backoff_is_jittered_and_capped(self):
+        assert all(
+            0 <= backoff(attempt, base_delay=1, max_delay=4) <= min(4, 2 ** (attempt - 1)) for attempt in range(1, 8)
+        )
+
+    def test_gives_up_after_attempts(self):
+        function = MagicMock(side_effect=_http_error(502), __name__="function")
+        sleep = MagicMock()
+
+        with pytest.raises(HTTPError):
+            retry(function, "foo", attempts=3, sleep=sleep)
+
+        assert function.call_count == 3
+        assert sleep.call_count == 2
+
+    def test_non_transient_is_not_retried(self):
+        function = MagicMock(side_effect=_http_error(400), __name__="function")
+
+        with pytest.raises(HTTPError):
+            retry(function, attempts=3, sleep=MagicMock())
+
+        assert function.call_count == 1
+
+    def test_returns_on_success(self):
+        function = MagicMock(side_effect=[ConnectionError(), "ok"], __name__="function")
+
+        assert retry(function, attempts=3, sleep=MagicMock()) == "ok"
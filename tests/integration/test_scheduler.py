@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from itertools import islice
+
+import pytest
+
+from integration.scheduler import CATCH_UP_MERGE, CATCH_UP_SEQUENTIAL, windows
+
+START_AT = datetime(2024, 10, 18)
+
+
+class FakeClock:
+    """Clock that only moves when slept on or when work is simulated"""
+
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += timedelta(seconds=seconds)
+
+
+def _at(seconds):
+    return START_AT + timedelta(seconds=seconds)
+
+
+class TestWindows:
+    def test_sleeps_until_boundary_without_drift(self):
+        clock = FakeClock(START_AT)
+        result = []
+        for window in islice(windows(START_AT, 10, now=clock, sleep=clock.sleep), 3):
+            result.append(window)
+            clock.now += timedelta(seconds=3)  # processing time
+
+        assert result == [(_at(0), _at(10)), (_at(10), _at(20)), (_at(20), _at(30))]
+        assert clock.sleeps == [10, 7, 7]
+
+    def test_sequential_catch_up(self):
+        clock = FakeClock(START_AT)
+        generator = windows(START_AT, 10, CATCH_UP_SEQUENTIAL, now=clock, sleep=clock.sleep)
+
+        assert next(generator) == (_at(0), _at(10))
+        clock.now = _at(45)  # a slow window
+        assert [next(generator) for _ in range(4)] == [
+            (_at(10), _at(20)),
+            (_at(20), _at(30)),
+            (_at(30), _at(40)),
+            (_at(40), _at(50)),
+        ]
+        assert clock.sleeps == [10, 5]
+
+    def test_merge_catch_up(self):
+        clock = FakeClock(START_AT)
+        generator = windows(START_AT, 10, CATCH_UP_MERGE, now=clock, sleep=clock.sleep)
+
+        assert next(generator) == (_at(0), _at(10))
+        clock.now = _at(45)
+        assert next(generator) == (_at(10), _at(40))
+        assert next(generator) == (_at(40), _at(50))
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            next(windows(START_AT, 10, "foo"))
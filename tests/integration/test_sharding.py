@@ -0,0 +1,105 @@
+import os
+import queue
+from unittest.mock import MagicMock, patch
+
+import pytest
+from helpers import raw_event
+
+from integration.events.constants import EVENT_MESSAGE, EVENT_START
+from integration.sharding import (ShardedRunner, ShardError, _worker,
+                                  partition, shard_for)
+
+START_AT = "2024-10-18 00:00:00"
+END_AT = "2024-10-18 00:00:10"
+LATER_AT = "2024-10-18 00:00:20"
+
+
+class TestPartition:
+    def test_shard_is_stable(self):
+        assert all(shard_for(conversation_id, 4) == shard_for(conversation_id, 4) for conversation_id in range(100))
+        assert {shard_for(conversation_id, 4) for conversation_id in range(100)} == {0, 1, 2, 3}
+
+    def test_conversation_order_is_kept(self):
+        events = [
+            raw_event(EVENT_START, 1),
+            raw_event(EVENT_START, 2),
+            raw_event(EVENT_MESSAGE, 1),
+            raw_event(EVENT_MESSAGE, 2),
+        ]
+
+        batches = partition(events, 3)
+
+        assert sum(len(batch) for batch in batches.values()) == len(events)
+        for batch in batches.values():
+            for conversation_id in (1, 2):
+                names = [event["event_name"] for event in batch if event["conversation_id"] == conversation_id]
+                assert names in ([], [EVENT_START, EVENT_MESSAGE])
+
+    def test_malformed_events_are_partitioned(self):
+        events = [{"event_name": EVENT_START}, None, raw_event(EVENT_START, 1)]
+
+        batches = partition(events, 3)
+
+        assert sum(len(batch) for batch in batches.values()) == len(events)
+
+
+class TestWorker:
+    @patch("integration.sharding.run_events")
+    def test_reports_progress(self, m_run_events):
+        m_run_events.side_effect = [None, ValueError("boom")]
+        inbox, progress = queue.Queue(), queue.Queue()
+        for batch in ([raw_event(EVENT_START, 1)], [raw_event(EVENT_START, 2), raw_event(EVENT_START, 3)], None):
+            inbox.put(batch)
+
+        with patch("logging.basicConfig"):
+            _worker(1, inbox, progress, 2, warm_up=False)
+
+        assert progress.get_nowait() == (1, 1, None)
+        assert progress.get_nowait() == (1, 2, "ValueError('boom')")
+        assert m_run_events.call_args_list[0].args[0] == [raw_event(EVENT_START, 1)]
+
+
+def _run_events(batch, logger, max_concurrency):
+    conversation_ids = {event["conversation_id"] for event in batch}
+    if "fail" in conversation_ids:
+        raise ValueError("boom")
+    if "die" in conversation_ids:
+        os._exit(1)
+
+
+def _stub_worker(*args):
+    """The real worker loop with events processed by _run_events, at module level so spawned workers import it"""
+    with patch("integration.sharding.run_events", _run_events), patch("integration.sharding.flush_pending"):
+        _worker(*args)
+
+
+@patch("integration.sharding._worker", _stub_worker)
+class TestShardedRunner:
+    @patch("integration.sharding.fetch_pages")
+    def test_windows_are_processed_by_shards(self, m_fetch_pages):
+        logger = MagicMock()
+        events = [raw_event(EVENT_START, conversation_id) for conversation_id in range(10)]
+        counts = [len(partition(events, 2)[shard]) for shard in range(2)]
+        m_fetch_pages.side_effect = [[events[:6], events[6:]], [[raw_event(EVENT_START, "fail")]]]
+
+        with ShardedRunner(2, logger, warm_up=False) as runner:
+            runner.run_window(START_AT, END_AT)
+            assert runner.processed == counts
+            summary = f"shard 0: {counts[0]} ({counts[0]} total), shard 1: {counts[1]} ({counts[1]} total)"
+            logger.info.assert_called_with(f"Window processed by shards, {summary}")
+
+            with pytest.raises(ShardError, match=f"shard {shard_for('fail', 2)}: ValueError\\('boom'\\)"):
+                runner.run_window(END_AT, LATER_AT)
+            assert sum(runner.processed) == len(events) + 1
+
+        assert [worker.exitcode for worker in runner.workers] == [0, 0]
+
+    @patch("integration.sharding.fetch_pages")
+    def test_dead_worker_is_detected(self, m_fetch_pages):
+        m_fetch_pages.return_value = [[raw_event(EVENT_START, "die")]]
+
+        with ShardedRunner(2, MagicMock(), warm_up=False) as runner:
+            with pytest.raises(ShardError, match=f"integration-shard-{shard_for('die', 2)} died"):
+                runner.run_window(START_AT, END_AT)
+
+        assert sorted(worker.exitcode for worker in runner.workers) == [0, 1]
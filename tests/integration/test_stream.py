@@ -0,0 +1,69 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from integration.constants import BIG_CHAT_API
+from integration.fetcher import fetch_pages
+from integration.stream import EventStream
+
+EVENTS = [
+    {"conversation_id": 1, "event_name": "START", "event_at": 1729225018, "data": None},
+    {"conversation_id": 2, "event_name": "MESSAGE", "event_at": 1729225019, "data": {"message": "héllo, [world]"}},
+    {"conversation_id": 3, "event_name": "TRANSFER", "event_at": 1729225020, "data": {"new_advisor_id": 12}},
+]
+NEXT_PAGE_URL = f"{BIG_CHAT_API}/events?page=1"
+
+
+def _chunks(body, size):
+    data = json.dumps(body, indent=1).encode()
+    return [data[index : index + size] for index in range(0, len(data), size)]
+
+
+class TestEventStream:
+    @pytest.mark.parametrize("chunk_size", (1, 2, 7, 64, 4096))
+    def test_events_and_next_page(self, chunk_size):
+        stream = EventStream(_chunks({"nextPageUrl": NEXT_PAGE_URL, "events": EVENTS}, chunk_size))
+
+        assert list(stream) == EVENTS
+        assert stream.next_page_url == NEXT_PAGE_URL
+
+    def test_next_page_after_events(self):
+        stream = EventStream(_chunks({"events": EVENTS, "nextPageUrl": None, "count": 1234}, 5))
+
+        assert list(stream) == EVENTS
+        assert stream.next_page_url is None
+
+    def test_no_events(self):
+        assert list(EventStream(_chunks({"nextPageUrl": None, "events": []}, 3))) == []
+
+    def test_events_are_yielded_as_they_arrive(self):
+        chunks = iter(_chunks({"nextPageUrl": None, "events": EVENTS}, 10))
+        stream = iter(EventStream(chunks))
+
+        assert next(stream) == EVENTS[0]
+        assert next(chunks, None) is not None  # the rest of the body wasn't read yet
+
+    def test_truncated_body(self):
+        data = json.dumps({"nextPageUrl": None, "events": EVENTS}).encode()[:-20]
+
+        with pytest.raises(ValueError):
+            list(EventStream([data]))
+
+
+class TestFetchPagesStreaming:
+    @patch("requests.Session.get")
+    def test_batches(self, m_get):
+        def _get(url, **kwargs):
+            body = {"nextPageUrl": NEXT_PAGE_URL if "page" not in url else None, "events": EVENTS}
+            response = MagicMock()
+            response.__enter__.return_value = response
+            response.iter_content.return_value = _chunks(body, 16)
+            return response
+
+        m_get.side_effect = _get
+
+        batches = list(fetch_pages("2024-10-18 00:00:00", "2024-10-18 00:00:10", stream=True, batch_size=2))
+
+        assert batches == [EVENTS[:2], EVENTS[2:], EVENTS[:2], EVENTS[2:]]
+        assert all(call.kwargs["stream"] for call in m_get.call_args_list)
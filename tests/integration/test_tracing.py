@@ -0,0 +1,59 @@
+import json
+import threading
+
+from integration.tracing import Profiler, Tracer
+
+
+def _work(n):
+    return sum(range(n))
+
+
+class TestTracer:
+    def test_disabled_records_nothing(self):
+        tracer = Tracer()
+
+        with tracer.span("fetch"):
+            pass
+        tracer.traced("resolve")(_work)(10)
+
+        assert tracer.events() == []
+
+    def test_spans(self, tmp_path):
+        tracer = Tracer()
+        tracer.enable()
+
+        with tracer.span("fetch", "GET /events", page=1):
+            tracer.traced("resolve")(_work)(10)
+
+        spans = [event for event in tracer.events() if event["ph"] == "X"]
+        # the inner span closes first
+        assert [(span["cat"], span["name"]) for span in spans] == [("resolve", "_work"), ("fetch", "GET /events")]
+        assert spans[1]["args"] == {"page": 1}
+        assert spans[1]["ts"] <= spans[0]["ts"] and spans[0]["dur"] <= spans[1]["dur"]
+
+        path = tmp_path / "trace.json"
+        tracer.write(str(path))
+        trace = json.loads(path.read_text())
+        assert {"name": "thread_name", "ph": "M"}.items() <= trace["traceEvents"][-1].items()
+
+
+class TestProfiler:
+    def test_threads_are_merged(self, tmp_path):
+        profiler = Profiler()
+        profiler.enable()
+
+        thread = threading.Thread(target=profiler.run, args=(_work, 10))
+        thread.start()
+        thread.join()
+        profiler.run(_work, 10)
+
+        calls = {function: stats[1] for (_, _, function), stats in profiler.stats().stats.items()}
+        assert calls["_work"] == 2
+        profiler.dump(str(tmp_path / "stats.prof"))
+        assert (tmp_path / "stats.prof").exists()
+
+    def test_disabled(self):
+        profiler = Profiler()
+
+        assert profiler.run(_work, 10) == 45
+        assert profiler.stats() is None
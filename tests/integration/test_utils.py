@@ -0,0 +1,235 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+from helpers import CONVERSATION_ID
+from requests import HTTPError
+
+from integration.constants import (BIG_CHAT_API, OUR_API,
+                                   OUR_API_NEXT_CURSOR_HEADER,
+                                   WARM_UP_PAGE_SIZE)
+from integration.events.events import _create_chat
+from integration.events.utils import (_agent_locks, advisor_cache, agent_cache,
+                                      agent_email_cache, chat_cache,
+                                      missing_chat_cache, search_chat,
+                                      search_or_create_agent, warm_up_caches,
+                                      write_as_agent)
+from integration.metrics import chat_lookup_misses
+
+ADVISOR_ID = 1
+CHAT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
+AGENT_ID = "efa505ac-d1b6-4b83-92f4-2f67ef03aff9"
+AGENT_NAME = "Jhon"
+EMAIL_NAME = "jhon@domain.com"
+
+
+def _response(json, status_code=HTTPStatus.OK, headers=None):
+    response = MagicMock(json=lambda: json, status_code=status_code, headers=headers or {})
+    if status_code >= 400:
+        response.raise_for_status.side_effect = HTTPError(response=response)
+    return response
+
+
+class TestSearchOrCreateAgent:
+    @patch("requests.Session.get")
+    def test_cache_hit_costs_no_calls(self, m_get):
+        m_get.side_effect = [
+            _response({"name": AGENT_NAME, "email_address": EMAIL_NAME}),
+            _response([{"agent_id": AGENT_ID}]),
+        ]
+
+        assert search_or_create_agent(ADVISOR_ID, MagicMock()) == AGENT_ID
+        assert search_or_create_agent(ADVISOR_ID, MagicMock()) == AGENT_ID
+
+        assert m_get.call_count == 2
+        assert agent_cache.hits == 1
+
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
+    def test_failed_create_invalidates(self, m_post, m_get):
+        m_get.side_effect = [
+            _response({"name": AGENT_NAME, "email_address": EMAIL_NAME}),
+            _response([]),
+        ]
+        m_post.return_value = _response({}, HTTPStatus.INTERNAL_SERVER_ERROR)
+
+        with pytest.raises(HTTPError):
+            search_or_create_agent(ADVISOR_ID, MagicMock())
+
+        assert ADVISOR_ID not in advisor_cache
+        assert ADVISOR_ID not in agent_cache
+
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
+    def test_conflict_looks_agent_up_again(self, m_post, m_get):
+        m_get.side_effect = [
+            _response({"name": AGENT_NAME, "email_address": EMAIL_NAME}),
+            _response([]),
+            _response({"name": AGENT_NAME, "email_address": EMAIL_NAME}),
+            _response([{"agent_id": AGENT_ID}]),
+        ]
+        m_post.return_value = _response({}, HTTPStatus.CONFLICT)
+
+        assert search_or_create_agent(ADVISOR_ID, MagicMock()) == AGENT_ID
+
+        assert m_get.call_args_list == [
+            call(f"{BIG_CHAT_API}/advisors/{ADVISOR_ID}"),
+            call(f"{OUR_API}/agents?email={EMAIL_NAME}"),
+            call(f"{BIG_CHAT_API}/advisors/{ADVISOR_ID}"),
+            call(f"{OUR_API}/agents?email={EMAIL_NAME}"),
+        ]
+        assert agent_cache.peek(ADVISOR_ID) == AGENT_ID
+
+    @patch("integration.events.utils._create_agent")
+    def test_advisor_is_resolved_once(self, m_create_agent):
+        m_create_agent.side_effect = lambda advisor_id, logger: time.sleep(0.05) or AGENT_ID
+
+        with ThreadPoolExecutor(4) as executor:
+            agent_ids = list(executor.map(lambda advisor_id: search_or_create_agent(advisor_id, MagicMock()), [1] * 4))
+
+        assert agent_ids == [AGENT_ID] * 4
+        m_create_agent.assert_called_once()
+        assert _agent_locks == {}
+
+    @patch("integration.events.utils._create_agent")
+    def test_advisors_are_resolved_concurrently(self, m_create_agent):
+        # both resolutions wait for each other, which a lock shared by every advisor would never let happen
+        barrier = threading.Barrier(2, timeout=1)
+
+        def _create_agent(advisor_id, logger):
+            barrier.wait()
+            return f"agent {advisor_id}"
+
+        m_create_agent.side_effect = _create_agent
+
+        with ThreadPoolExecutor(2) as executor:
+            agent_ids = list(executor.map(lambda advisor_id: search_or_create_agent(advisor_id, MagicMock()), [1, 2]))
+
+        assert agent_ids == ["agent 1", "agent 2"]
+        assert _agent_locks == {}
+
+
+class TestWriteAsAgent:
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
+    def test_unknown_agent_is_resolved_again(self, m_post, m_get):
+        # cached before OurAPI restarted with an empty database
+        advisor_cache.set(ADVISOR_ID, {"name": AGENT_NAME, "email_address": EMAIL_NAME})
+        agent_cache.set(ADVISOR_ID, "stale")
+        agent_email_cache.set(EMAIL_NAME, "stale")
+        m_get.return_value = _response([])
+        m_post.side_effect = [
+            _response({"detail": "That agent does not exist."}, HTTPStatus.BAD_REQUEST),
+            _response({"agent_id": AGENT_ID}, HTTPStatus.CREATED),
+            _response({"chat_id": CHAT_ID}, HTTPStatus.CREATED),
+        ]
+
+        _create_chat(CONVERSATION_ID, 1729225018, MagicMock(), advisor_id=ADVISOR_ID)
+
+        assert [args.args[0] for args in m_post.call_args_list] == [
+            f"{OUR_API}/chats",
+            f"{OUR_API}/agents",
+            f"{OUR_API}/chats",
+        ]
+        assert m_post.call_args.kwargs["json"]["agent_id"] == AGENT_ID
+        assert m_get.call_args_list == [call(f"{OUR_API}/agents?email={EMAIL_NAME}")]
+        assert agent_cache.peek(ADVISOR_ID) == AGENT_ID
+        assert agent_email_cache.peek(EMAIL_NAME) is None
+
+    @patch("integration.events.utils.search_or_create_agent", return_value=AGENT_ID)
+    def test_agent_is_resolved_again_once(self, m_search_or_create_agent):
+        response = _response({"detail": "That agent does not exist."}, HTTPStatus.BAD_REQUEST)
+        write = MagicMock(return_value=response)
+        agent_cache.set(ADVISOR_ID, AGENT_ID)
+
+        assert write_as_agent(ADVISOR_ID, MagicMock(), write) is response
+
+        assert write.call_count == m_search_or_create_agent.call_count == 2
+        assert ADVISOR_ID not in agent_cache
+
+
+class TestSearchChat:
+    @pytest.fixture(autouse=True)
+    def clear_chat_caches(self):
+        chat_cache.clear()
+        missing_chat_cache.clear()
+        chat_lookup_misses.clear()
+        yield
+        chat_cache.clear()
+        missing_chat_cache.clear()
+
+    @patch("requests.Session.get")
+    def test_miss_is_cached(self, m_get):
+        m_get.return_value = _response([])
+
+        assert search_chat(CONVERSATION_ID) is None
+        assert search_chat(CONVERSATION_ID) is None
+
+        assert m_get.call_args_list == [call(f"{OUR_API}/chats?external_id={CONVERSATION_ID}")]
+        assert missing_chat_cache.hits == 1
+        assert chat_lookup_misses.total() == 1
+
+    @patch("requests.Session.get")
+    def test_miss_expires(self, m_get):
+        m_get.side_effect = [_response([]), _response([{"chat_id": CHAT_ID}])]
+
+        assert search_chat(CONVERSATION_ID) is None
+        with patch.object(missing_chat_cache, "clock", lambda: float("inf")):
+            assert search_chat(CONVERSATION_ID) == CHAT_ID
+
+        assert m_get.call_count == 2
+
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
+    def test_creating_the_chat_invalidates_the_miss(self, m_post, m_get):
+        m_get.return_value = _response([])
+        m_post.return_value = _response({"chat_id": CHAT_ID}, HTTPStatus.CREATED)
+        agent_cache.set(ADVISOR_ID, AGENT_ID)
+
+        assert search_chat(CONVERSATION_ID) is None
+        _create_chat(CONVERSATION_ID, 1729225018, MagicMock(), advisor_id=ADVISOR_ID)
+
+        assert CONVERSATION_ID not in missing_chat_cache
+        assert search_chat(CONVERSATION_ID) == CHAT_ID
+        assert m_get.call_count == 1
+
+
+class TestWarmUpCaches:
+    @patch("requests.Session.get")
+    def test_warm_up(self, m_get):
+        chat_cache.clear()
+        m_get.side_effect = [
+            _response([{"agent_id": AGENT_ID, "name": AGENT_NAME, "email": EMAIL_NAME}]),
+            _response(
+                [
+                    {"chat_id": "old", "external_id": "1", "ended_at": None},
+                    {"chat_id": "foreign", "external_id": "abc", "ended_at": None},
+                ],
+                headers={OUR_API_NEXT_CURSOR_HEADER: "cursor"},
+            ),
+            _response([{"chat_id": "new", "external_id": "2", "ended_at": None}]),
+        ]
+
+        warm_up_caches(MagicMock())
+
+        params = {"open_only": "true", "limit": WARM_UP_PAGE_SIZE}
+        assert m_get.call_args_list == [
+            call(f"{OUR_API}/agents"),
+            call(f"{OUR_API}/chats", params=params),
+            call(f"{OUR_API}/chats", params={**params, "cursor": "cursor"}),
+        ]
+        assert agent_email_cache.peek(EMAIL_NAME) == AGENT_ID
+        assert chat_cache.peek(1) == "old"
+        assert chat_cache.peek(2) == "new"
+        assert len(chat_cache) == 2
+
+    @patch("requests.Session.get")
+    def test_agent_resolution_after_warm_up(self, m_get):
+        agent_email_cache.set(EMAIL_NAME, AGENT_ID)
+        m_get.return_value = _response({"name": AGENT_NAME, "email_address": EMAIL_NAME})
+
+        assert search_or_create_agent(ADVISOR_ID, MagicMock()) == AGENT_ID
+        assert m_get.call_args_list == [call(f"{BIG_CHAT_API}/advisors/{ADVISOR_ID}")]
@@ -0,0 +1,43 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# OurAPI imports its packages as top level modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "our_api"))
+
+import database  # noqa: E402
+import main  # noqa: E402
+import schemas  # noqa: E402
+from agent_cache import agent_cache  # noqa: E402
+
+STARTED_AT = datetime(2024, 10, 18)
+
+
+@pytest.fixture
+def session():
+    database.init_db()
+    agent_cache.clear()
+    session = database.SessionLocal()
+    yield session
+    session.close()
+    database.Base.metadata.drop_all(bind=database.engine)
+    agent_cache.clear()
+
+
+@pytest.fixture
+def agent_id(session):
+    agent = main.post_agent(schemas.AgentCreate(name="Jhon", email="jhon@domain.com"), main.Response(), session)
+    return agent.agent_id
+
+
+@pytest.fixture
+def create_chat(session):
+    """Create a chat through the route and return it"""
+
+    def _create_chat(external_id, started_at=STARTED_AT, **kwargs):
+        data = schemas.ChatCreate(external_id=external_id, started_at=started_at, **kwargs)
+        return main.post_chat(data, main.Response(), session)
+
+    return _create_chat
@@ -0,0 +1,59 @@
+from datetime import datetime
+from unittest.mock import patch
+from uuid import uuid4
+
+
+import main
+import schemas
+from agent_cache import AgentCache, agent_cache
+
+STARTED_AT = datetime(2024, 10, 18)
+
+
+class TestAgentCache:
+    def test_unknown_counts_hits_and_misses(self):
+        cache = AgentCache()
+        known, unknown = uuid4(), uuid4()
+        cache.add(known)
+
+        assert cache.unknown([known, unknown, None]) == {unknown}
+        assert (cache.hits, cache.misses, cache.hit_rate) == (1, 1, 0.5)
+
+    def test_drops_the_least_recently_used(self):
+        cache = AgentCache(max_size=2)
+        first, second, third = uuid4(), uuid4(), uuid4()
+        cache.add(first)
+        cache.add(second)
+        cache.unknown([first])
+
+        cache.add(third)
+
+        assert len(cache) == 2
+        assert cache.unknown([first, second, third]) == {second}
+
+
+class TestRoutes:
+    def test_created_agents_are_validated_without_a_query(self, session):
+        agent = main.post_agent(schemas.AgentCreate(name="Jhon", email="jhon@domain.com"), main.Response(), session)
+
+        with patch.object(session, "scalars", wraps=session.scalars) as scalars:
+            data = schemas.ChatCreate(external_id="1", started_at=STARTED_AT, agent_id=agent.agent_id)
+            main.post_chat(data, main.Response(), session)
+
+        scalars.assert_not_called()
+        assert agent_cache.hits == 1
+
+    def test_agents_found_in_the_database_are_cached(self, session):
+        agent = main.post_agent(schemas.AgentCreate(name="Jhon", email="jhon@domain.com"), main.Response(), session)
+        agent_cache.clear()
+
+        assert main._existing_agents(session, [agent.agent_id]) == {agent.agent_id}
+        assert main._existing_agents(session, {agent.agent_id, uuid4()}) == {agent.agent_id}
+        assert (agent_cache.hits, agent_cache.misses) == (1, 2)
+
+    def test_unknown_agents_are_not_cached(self, session):
+        agent_id = uuid4()
+
+        assert main._existing_agents(session, [agent_id]) == set()
+        assert main._existing_agents(session, [agent_id]) == set()
+        assert len(agent_cache) == 0
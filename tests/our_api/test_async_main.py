@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException, Response
+
+import async_main
+import schemas
+from database import Base
+from database.async_base import AsyncSessionLocal
+from database.async_base import async_engine, init_async_db
+from pagination import NEXT_CURSOR_HEADER
+
+STARTED_AT = datetime(2024, 10, 18)
+
+
+def _run(test):
+    """Run the test coroutine with a fresh schema on a single event loop"""
+
+    async def _test():
+        await init_async_db()
+        try:
+            async with AsyncSessionLocal() as session:
+                await test(session)
+        finally:
+            async with async_engine.begin() as connection:
+                await connection.run_sync(Base.metadata.drop_all)
+            await async_engine.dispose()
+
+    asyncio.run(_test())
+
+
+class TestAsyncRoutes:
+    def test_chat_lifecycle(self):
+        async def _test(session):
+            agent = await async_main.post_agent(
+                schemas.AgentCreate(name="Jhon", email="jhon@domain.com"), Response(), session
+            )
+            data = schemas.ChatCreate(external_id="1", started_at=STARTED_AT, agent_id=agent.agent_id)
+            chat = await async_main.post_chat(data, Response(), session)
+            ended_at = STARTED_AT + timedelta(hours=1)
+            await async_main.patch_chat(chat.chat_id, schemas.ChatUpdate(ended_at=ended_at), session)
+            for number in range(3):
+                message = schemas.MessageCreate(sent_at=STARTED_AT + timedelta(seconds=number), text="foo bar")
+                await async_main.post_chat_message(chat.chat_id, message, session)
+
+            chats = await async_main.get_chats(Response(), external_id="1", session=session)
+            assert [(chat.agent_id, chat.ended_at) for chat in chats] == [(agent.agent_id, ended_at)]
+
+            response = Response()
+            messages = await async_main.get_chat_messages(chat.chat_id, response, limit=2, session=session)
+            assert len(messages) == 2
+            cursor = response.headers[NEXT_CURSOR_HEADER]
+            messages = await async_main.get_chat_messages(chat.chat_id, Response(), cursor, session=session)
+            assert len(messages) == 1
+
+        _run(_test)
+
+    def test_unknown_agent(self):
+        async def _test(session):
+            data = schemas.ChatCreate(external_id="1", started_at=STARTED_AT, agent_id=uuid4())
+            with pytest.raises(HTTPException) as exception:
+                await async_main.post_chat(data, Response(), session)
+            assert exception.value.status_code == HTTPStatus.BAD_REQUEST
+
+        _run(_test)
+
+    def test_batch(self):
+        async def _test(session):
+            data = [
+                schemas.ChatCreate(external_id="1", started_at=STARTED_AT),
+                schemas.ChatCreate(external_id="1", started_at=STARTED_AT),
+            ]
+            results = await async_main.post_chats_batch(data, session)
+            assert [result.status for result in results] == [HTTPStatus.CREATED, HTTPStatus.CONFLICT]
+
+            updates = [schemas.ChatBatchUpdate(chat_id=results[0].id, ended_at=STARTED_AT)]
+            results = await async_main.patch_chats_batch(updates, session)
+            assert [result.status for result in results] == [HTTPStatus.NO_CONTENT]
+
+        _run(_test)
+
+    def test_by_external_id(self):
+        async def _test(session):
+            response = Response()
+            data = schemas.ChatUpsert(started_at=STARTED_AT)
+            chat = await async_main.put_chat_by_external_id("1", data, response, session)
+            assert response.status_code == HTTPStatus.CREATED
+
+            response = Response()
+            ended_at = STARTED_AT + timedelta(hours=1)
+            data = schemas.ChatUpsert(started_at=STARTED_AT, ended_at=ended_at)
+            upserted = await async_main.put_chat_by_external_id("1", data, response, session)
+            assert response.status_code == HTTPStatus.OK
+            assert (upserted.chat_id, upserted.ended_at) == (chat.chat_id, ended_at)
+
+            message = schemas.MessageCreate(sent_at=STARTED_AT, text="foo bar")
+            await async_main.post_chat_message_by_external_id("1", message, session)
+            messages = await async_main.get_chat_messages(chat.chat_id, Response(), session=session)
+            assert [message.text for message in messages] == ["foo bar"]
+
+            with pytest.raises(HTTPException) as exception:
+                await async_main.post_chat(
+                    schemas.ChatCreate(external_id="1", started_at=STARTED_AT), Response(), session
+                )
+            assert exception.value.status_code == HTTPStatus.CONFLICT
+
+        _run(_test)
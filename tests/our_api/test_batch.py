@@ -0,0 +1,106 @@
+from datetime import datetime
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+import database
+import main
+import schemas
+
+STARTED_AT = datetime(2024, 10, 18)
+
+
+def _count(session, model):
+    return session.scalar(select(func.count()).select_from(model))
+
+
+class TestPostChatsBatch:
+    def test_results_per_item(self, session, agent_id, create_chat):
+        create_chat("1")
+        data = [
+            schemas.ChatCreate(external_id="2", started_at=STARTED_AT, agent_id=agent_id),
+            schemas.ChatCreate(external_id="1", started_at=STARTED_AT),
+            schemas.ChatCreate(external_id="3", started_at=STARTED_AT, agent_id=uuid4()),
+            schemas.ChatCreate(external_id="2", started_at=STARTED_AT),
+        ]
+
+        results = main.post_chats_batch(data, session)
+
+        assert [result.status for result in results] == [
+            HTTPStatus.CREATED,
+            HTTPStatus.CONFLICT,
+            HTTPStatus.BAD_REQUEST,
+            HTTPStatus.CONFLICT,
+        ]
+        chat = session.get(database.Chat, results[0].id)
+        assert (chat.external_id, chat.agent_id) == ("2", agent_id)
+        assert _count(session, database.Chat) == 2
+
+    def test_conflict_rolls_everything_back(self, session, monkeypatch, create_chat):
+        # another writer takes the external ID between the check and the commit
+        monkeypatch.setattr(
+            main, "taken_external_ids_query", lambda external_ids: select(database.Chat.external_id).where(False)
+        )
+        create_chat("1")
+
+        with pytest.raises(HTTPException) as exception:
+            main.post_chats_batch(
+                [
+                    schemas.ChatCreate(external_id="2", started_at=STARTED_AT),
+                    schemas.ChatCreate(external_id="1", started_at=STARTED_AT),
+                ],
+                session,
+            )
+
+        assert exception.value.status_code == HTTPStatus.CONFLICT
+        assert _count(session, database.Chat) == 1
+
+
+class TestPatchChatsBatch:
+    def test_results_per_item(self, session, agent_id, create_chat):
+        chat_id = create_chat("1").chat_id
+        ended_at = datetime(2024, 10, 19)
+        data = [
+            schemas.ChatBatchUpdate(chat_id=chat_id, ended_at=ended_at),
+            schemas.ChatBatchUpdate(chat_id=uuid4(), ended_at=ended_at),
+            schemas.ChatBatchUpdate(chat_id=chat_id, agent_id=uuid4()),
+            schemas.ChatBatchUpdate(chat_id=chat_id, agent_id=agent_id),
+        ]
+
+        results = main.patch_chats_batch(data, session)
+
+        assert [result.status for result in results] == [
+            HTTPStatus.NO_CONTENT,
+            HTTPStatus.NOT_FOUND,
+            HTTPStatus.BAD_REQUEST,
+            HTTPStatus.NO_CONTENT,
+        ]
+        chat = session.get(database.Chat, chat_id)
+        assert (chat.ended_at, chat.agent_id, chat.started_at) == (ended_at, agent_id, STARTED_AT)
+
+
+class TestPostMessagesBatch:
+    def test_results_per_item(self, session, agent_id, create_chat):
+        chat_ids = [create_chat("1").chat_id, create_chat("2").chat_id]
+        data = [
+            schemas.MessageCreate(chat_id=chat_ids[0], sent_at=STARTED_AT, text="foo bar"),
+            schemas.MessageCreate(chat_id=chat_ids[1], sent_at=STARTED_AT, text="foo bar", agent_id=agent_id),
+            schemas.MessageCreate(chat_id=uuid4(), sent_at=STARTED_AT, text="foo bar"),
+            schemas.MessageCreate(sent_at=STARTED_AT, text="foo bar"),
+            schemas.MessageCreate(chat_id=chat_ids[0], sent_at=STARTED_AT, text="foo bar", agent_id=uuid4()),
+        ]
+
+        results = main.post_messages_batch(data, session)
+
+        assert [result.status for result in results] == [
+            HTTPStatus.CREATED,
+            HTTPStatus.CREATED,
+            HTTPStatus.NOT_FOUND,
+            HTTPStatus.NOT_FOUND,
+            HTTPStatus.BAD_REQUEST,
+        ]
+        messages = [main.get_chat_messages(chat_id, main.Response(), session=session) for chat_id in chat_ids]
+        assert [len(page) for page in messages] == [1, 1]
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+import database
+import main
+import schemas
+
+STARTED_AT = datetime(2024, 10, 18)
+ENDED_AT = STARTED_AT + timedelta(hours=1)
+
+
+def _put_chat(session, external_id, **data):
+    response = main.Response()
+    chat = main.put_chat_by_external_id(
+        external_id, schemas.ChatUpsert(started_at=STARTED_AT, **data), response, session
+    )
+    return chat, response
+
+
+class TestPutChatByExternalId:
+    def test_creates_the_chat(self, session, agent_id):
+        chat, response = _put_chat(session, "1", agent_id=agent_id)
+
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.headers["Location"] == f"/chats/{chat.chat_id}"
+        assert (chat.external_id, chat.agent_id, chat.ended_at) == ("1", agent_id, None)
+
+    def test_edits_the_existing_chat(self, session, agent_id):
+        chat, _ = _put_chat(session, "1", agent_id=agent_id)
+
+        upserted, response = _put_chat(session, "1", ended_at=ENDED_AT)
+
+        assert response.status_code == HTTPStatus.OK
+        assert upserted.chat_id == chat.chat_id
+        # fields missing from the body are kept
+        assert (upserted.agent_id, upserted.ended_at) == (agent_id, ENDED_AT)
+        assert session.scalar(select(func.count()).select_from(database.Chat)) == 1
+
+    def test_unknown_agent(self, session):
+        with pytest.raises(HTTPException) as exception:
+            _put_chat(session, "1", agent_id=uuid4())
+
+        assert exception.value.status_code == HTTPStatus.BAD_REQUEST
+
+
+class TestByExternalId:
+    def test_patch_chat(self, session, agent_id):
+        chat, _ = _put_chat(session, "1")
+
+        main.patch_chat_by_external_id("1", schemas.ChatUpdate(agent_id=agent_id, ended_at=ENDED_AT), session)
+
+        session.refresh(chat)
+        assert (chat.agent_id, chat.ended_at) == (agent_id, ENDED_AT)
+
+    def test_post_chat_message(self, session):
+        chat, _ = _put_chat(session, "1")
+
+        main.post_chat_message_by_external_id("1", schemas.MessageCreate(sent_at=STARTED_AT, text="foo bar"), session)
+
+        messages = main.get_chat_messages(chat.chat_id, main.Response(), session=session)
+        assert [message.text for message in messages] == ["foo bar"]
+
+    def test_unknown_chat(self, session):
+        with pytest.raises(HTTPException) as exception:
+            main.patch_chat_by_external_id("1", schemas.ChatUpdate(ended_at=ENDED_AT), session)
+
+        assert exception.value.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_post_chat_with_a_taken_external_id(session):
+    _put_chat(session, "1")
+
+    with pytest.raises(HTTPException) as exception:
+        main.post_chat(schemas.ChatCreate(external_id="1", started_at=STARTED_AT), main.Response(), session)
+
+    assert exception.value.status_code == HTTPStatus.CONFLICT
+    # the session was rolled back and can still be used
+    assert session.scalar(select(func.count()).select_from(database.Chat)) == 1
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
+import pytest
+from fastapi import HTTPException, Response
+
+import main
+import schemas
+from pagination import NEXT_CURSOR_HEADER
+
+STARTED_AT = datetime(2024, 10, 18)
+
+
+def _pages(list_page, **kwargs):
+    """Every page following the cursors"""
+    pages, cursor = [], None
+    while True:
+        response = Response()
+        pages.append(list_page(response=response, cursor=cursor, **kwargs))
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+
+
+class TestGetChats:
+    def test_pages(self, session, create_chat):
+        # same started_at for some of them so the chat_id breaks the ties
+        for number in range(5):
+            create_chat(str(number), STARTED_AT + timedelta(seconds=number // 2))
+
+        pages = _pages(main.get_chats, limit=2, session=session)
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        chats = [chat for page in pages for chat in page]
+        assert sorted(chat.external_id for chat in chats) == ["0", "1", "2", "3", "4"]
+        assert [chat.started_at for chat in chats] == sorted(chat.started_at for chat in chats)
+
+    def test_filters(self, session, create_chat):
+        agent = main.post_agent(schemas.AgentCreate(name="Jhon", email="jhon@domain.com"), Response(), session)
+        create_chat("1", ended_at=STARTED_AT + timedelta(hours=1))
+        create_chat("2", STARTED_AT + timedelta(days=1), agent_id=agent.agent_id)
+        create_chat("3", STARTED_AT + timedelta(days=2))
+
+        def _external_ids(**filters):
+            return [chat.external_id for chat in main.get_chats(Response(), session=session, **filters)]
+
+        assert _external_ids(open_only=True) == ["2", "3"]
+        assert _external_ids(agent_id=agent.agent_id) == ["2"]
+        assert _external_ids(started_after=STARTED_AT + timedelta(days=1)) == ["2", "3"]
+        assert _external_ids(started_before=STARTED_AT + timedelta(days=1)) == ["1"]
+        assert _external_ids(ended_before=STARTED_AT + timedelta(days=1)) == ["1"]
+        assert _external_ids(external_id="3") == ["3"]
+
+    def test_invalid_cursor(self, session):
+        with pytest.raises(HTTPException) as exception:
+            main.get_chats(Response(), cursor="foo", session=session)
+
+        assert exception.value.status_code == HTTPStatus.BAD_REQUEST
+
+
+class TestGetChatMessages:
+    def test_pages(self, session, create_chat):
+        chat_id = create_chat("1").chat_id
+        for number in range(3):
+            data = schemas.MessageCreate(sent_at=STARTED_AT + timedelta(seconds=number), text=f"message {number}")
+            main.post_chat_message(chat_id, data, session)
+
+        pages = _pages(main.get_chat_messages, chat_id=chat_id, limit=2, session=session)
+
+        assert [[message.text for message in page] for page in pages] == [["message 0", "message 1"], ["message 2"]]
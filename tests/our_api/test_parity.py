@@ -0,0 +1,80 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+import async_main
+import database
+import main
+from database.async_base import async_engine
+from pagination import NEXT_CURSOR_HEADER
+
+UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+STARTED_AT = "2024-10-18T00:00:00"
+
+
+async def _drop_async_tables():
+    async with async_engine.begin() as connection:
+        await connection.run_sync(database.Base.metadata.drop_all)
+    await async_engine.dispose()
+
+
+@pytest.fixture
+def sync_client():
+    with TestClient(main.app) as client:
+        yield client
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+@pytest.fixture
+def async_client():
+    with TestClient(async_main.app) as client:
+        yield client
+        client.portal.call(_drop_async_tables)
+
+
+def _conversation(client) -> list:
+    """
+    The same requests against an app, every response with its IDs numbered in the order they
+    first show up since each app generates its own
+    """
+    ids, calls = {}, []
+
+    def _call(method, path, **kwargs):
+        response = client.request(method, path, **kwargs)
+        body = response.text
+        headers = {"location": response.headers.get("location"), "cursor": NEXT_CURSOR_HEADER in response.headers}
+        text = f"{response.status_code} {body} {headers}"
+        calls.append(UUID.sub(lambda match: ids.setdefault(match.group(), f"<id {len(ids)}>"), text))
+        return response
+
+    agent_id = _call("POST", "/agents", json={"name": "Jhon", "email": "jhon@domain.com"}).json()["agent_id"]
+    _call("GET", f"/agents/{agent_id}")
+    _call("GET", "/agents", params={"email": "jhon@domain.com"})
+
+    chat = {"external_id": "1", "started_at": STARTED_AT, "agent_id": agent_id}
+    chat_id = _call("POST", "/chats", json=chat).json()["chat_id"]
+    _call("POST", "/chats", json=chat)
+    _call("POST", "/chats", json={**chat, "external_id": "2", "agent_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6"})
+    _call("GET", "/chats", params={"external_id": "1"})
+    _call("GET", f"/chats/{chat_id}")
+    _call("PATCH", f"/chats/{chat_id}", json={"ended_at": "2024-10-18T01:00:00"})
+    _call("POST", f"/chats/{chat_id}/messages", json={"sent_at": STARTED_AT, "text": "foo bar"})
+    _call("POST", f"/chats/{chat_id}/messages", json={"sent_at": STARTED_AT, "text": "a"})
+    _call("GET", f"/chats/{chat_id}/messages")
+
+    _call("PUT", "/chats/external/2", json={"started_at": STARTED_AT})
+    _call("PUT", "/chats/external/2", json={"started_at": STARTED_AT, "agent_id": agent_id})
+    _call("PATCH", "/chats/external/2", json={"ended_at": "2024-10-18T02:00:00"})
+    _call("PATCH", "/chats/external/3", json={"ended_at": "2024-10-18T02:00:00"})
+    _call("POST", "/chats/external/2/messages", json={"sent_at": STARTED_AT, "text": "foo bar"})
+
+    results = _call("POST", "/batch/chats", json=[{"external_id": "3", "started_at": STARTED_AT}, chat]).json()
+    _call("PATCH", "/batch/chats", json=[{"chat_id": results[0]["id"], "ended_at": STARTED_AT}])
+    _call("POST", "/batch/messages", json=[{"chat_id": chat_id, "sent_at": STARTED_AT, "text": "foo bar"}])
+    _call("GET", "/chats", params={"external_id": "1", "limit": 1})
+    return calls
+
+
+def test_sync_and_async_apps_answer_the_same(sync_client, async_client):
+    assert _conversation(async_client) == _conversation(sync_client)